@@ -0,0 +1,77 @@
+"""
+Checks how long the command line takes to import, using ``python -X importtime``.
+
+Exits with a non-zero status if a module takes longer than its budget to import, or if it pulls in a heavy module
+that should only be imported when it is used. Run from the root of the repository::
+
+    python benchmarks/bench_import_time.py
+"""
+import os
+import subprocess
+import sys
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module: (budget in milliseconds, modules it must not import)
+BUDGETS = {
+    'smlgui.main': (150, ('PyQt5', 'numpy', 'sklearn', 'smlgui.gui.assets.style_rc')),
+    'smlgui.processor': (400, ('PyQt5', 'sklearn')),
+    'smlgui.utility': (400, ('PyQt5', 'sklearn', 'smlgui.gui.assets.style_rc')),
+}
+
+
+def import_time(module):
+    """
+    Imports ``module`` in a fresh interpreter.
+
+    Parameters
+    ----------
+    module: str
+        Name of the module.
+
+    Returns
+    -------
+    flow  :  dict
+        Cumulative import time in microseconds of every module that was imported, by name.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=ROOT,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    flow = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        flow[name.strip()] = int(cumulative)
+    return flow
+
+
+@click.command()
+@click.option('--repeat', default=5, help="Number of times each module is imported, the best time is kept.")
+def main(repeat):
+    """
+    Reports the import time of each module against its budget.
+    """
+    failed = False
+
+    for module, (budget, forbidden) in sorted(BUDGETS.items()):
+        runs = [import_time(module) for _ in range(repeat)]
+        best = min(run[module] for run in runs) / 1000
+        imported = [name for name in forbidden if name in runs[0]]
+
+        status = 'ok'
+        if best > budget or imported:
+            status = 'FAIL'
+            failed = True
+
+        click.echo("{:<20} {:>8.1f} ms (budget {} ms) {}".format(module, best, budget, status))
+        for name in imported:
+            click.echo("    imports " + name)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
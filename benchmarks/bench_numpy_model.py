@@ -0,0 +1,57 @@
+"""
+Measures how many ``NumpyModel`` cells are rendered per second while scrolling a ``QTableView``.
+
+Run from the root of the repository::
+
+    python benchmarks/bench_numpy_model.py --rows 100000 --columns 14
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click  # noqa: E402
+import numpy as np  # noqa: E402
+from PyQt5 import QtWidgets  # noqa: E402
+
+from smlgui.widgets import NumpyModel  # noqa: E402
+
+
+@click.command()
+@click.option('--rows', default=100000, help="Number of rows in the table.")
+@click.option('--columns', default=14, help="Number of columns in the table.")
+@click.option('--steps', default=500, help="Number of scroll steps.")
+def main(rows, columns, steps):
+    """
+    Scrolls through a ``rows`` x ``columns`` table and reports the rendered cells per second.
+    """
+    app = QtWidgets.QApplication(sys.argv)
+
+    view = QtWidgets.QTableView()
+    view.resize(1000, 800)
+    view.setModel(NumpyModel(np.random.randn(rows, columns)))
+    view.show()
+    app.processEvents()
+
+    scroll_bar = view.verticalScrollBar()
+    visible_rows = view.rowAt(view.viewport().height() - 1) - view.rowAt(0) + 1
+
+    scrolls = [('sequential', np.arange(steps) * scroll_bar.singleStep() * 3),
+               ('jump', np.linspace(0, scroll_bar.maximum(), steps).astype(int))]
+
+    for name, positions in scrolls:
+        start = time.perf_counter()
+        for position in positions:
+            scroll_bar.setValue(int(position))
+            view.viewport().repaint()
+        elapsed = time.perf_counter() - start
+
+        cells = visible_rows * columns * steps
+        click.echo("{}: {} frames, {} cells in {:.3f} s: {:.0f} cells/s, {:.2f} ms/frame".format(
+            name, steps, cells, elapsed, cells / elapsed, 1000 * elapsed / steps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Times the load, split, render and export paths on a synthetic sample folder, and keeps the results so that releases
+can be compared.
+
+Every run is written to ``benchmarks/results`` as JSON. Passing an earlier result with ``--compare`` prints the
+change of every benchmark and exits with a non-zero status if one got slower than ``--threshold``. Run from the root
+of the repository::
+
+    python benchmarks/bench_suite.py --samples 1000
+    python benchmarks/bench_suite.py --samples 1000 --compare benchmarks/results/<earlier run>.json
+"""
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import click  # noqa: E402
+import numpy as np  # noqa: E402
+
+from smlgui import __version__  # noqa: E402
+from smlgui.processor import export_sml, import_sml  # noqa: E402
+from smlgui.sml import SMLReader  # noqa: E402
+from smlgui.utility import ReadCSV, natural_keys  # noqa: E402
+from synthetic import make_samples  # noqa: E402
+
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Name: setup function, run in order. A setup function prepares everything the benchmark needs and returns the
+# callable that is timed.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a setup function under ``name``.
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+@benchmark('read_samples')
+def read_samples(context):
+    return lambda: ReadCSV(context['folder'], cache=False).read_samples()
+
+
+@benchmark('read_samples_cached')
+def read_samples_cached(context):
+    ReadCSV(context['folder'], cache_dir=context['cache']).read_samples()
+    return lambda: ReadCSV(context['folder'], cache_dir=context['cache']).read_samples()
+
+
+@benchmark('refresh')
+def refresh(context):
+    folder = os.path.join(context['temp'], 'refresh')
+
+    # Appends a sample and then deletes the first one, refreshing after each. The second refresh once sniffed the
+    # format from the deleted file, so the result is checked too.
+    def run():
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.copytree(context['folder'], folder)
+        read_csv = ReadCSV(folder, cache=False)
+        samples = len(read_csv.read_samples())
+        first = os.path.join(folder, 'sam1_eeg.csv')
+        shutil.copy(first, os.path.join(folder, 'sam{}_eeg.csv'.format(samples + 1)))
+        read_csv.refresh()
+        os.remove(first)
+        if len(read_csv.refresh()) != samples:
+            raise AssertionError("Refresh after a deleted sample did not keep {} samples".format(samples))
+
+    return run
+
+
+@benchmark('get_split_data')
+def get_split_data(context):
+    read_csv = context['read_csv']
+
+    def run():
+        split = read_csv.get_split_data(seed=0, stratify=True)
+        np.asarray(split['train_data'])
+        np.asarray(split['test_data'])
+
+    return run
+
+
+@benchmark('k_fold_split')
+def k_fold_split(context):
+    return lambda: list(context['read_csv'].k_fold_split(n_splits=10, seed=0, stratify=True))
+
+
+@benchmark('natural_keys')
+def natural_keys_sort(context):
+    names = ['sam{}_eeg.csv'.format(number) for number in np.random.RandomState(0).permutation(100000) + 1]
+    return lambda: sorted(names, key=natural_keys)
+
+
+@benchmark('numpy_model')
+def numpy_model(context):
+    from PyQt5 import QtWidgets
+    from smlgui.widgets import NumpyModel
+
+    context['app'] = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    data = np.asarray(context['read_csv'].read_samples())
+    data = data.reshape(-1, data.shape[-1])
+
+    # Reads 40 visible rows at 200 positions spread over the table, like dragging the scroll bar.
+    starts = np.linspace(0, max(len(data) - 40, 0), 200).astype(int)
+
+    def run():
+        model = NumpyModel(data)
+        for start in starts:
+            for row in range(start, min(start + 40, len(data))):
+                for column in range(data.shape[1]):
+                    model.data(model.index(row, column))
+
+    return run
+
+
+@benchmark('signal_plot')
+def signal_plot(context):
+    from PyQt5 import QtWidgets
+    from smlgui.widgets import SignalPlotWidget
+
+    context['app'] = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    plot = SignalPlotWidget()
+    plot.resize(1200, 600)
+    context['plot'] = plot
+
+    # A million time steps per channel, zoomed into and panned across like an operator inspecting a recording.
+    data = np.random.RandomState(0).randn(1000000, context['features']).cumsum(axis=0)
+
+    def run():
+        plot.set_data(data)
+        for step in range(20):
+            start, stop = plot.view_range()
+            plot.set_view_range(start + (stop - start) * 0.1, stop - (stop - start) * 0.1)
+            plot.repaint()
+        for step in range(20):
+            start, stop = plot.view_range()
+            plot.set_view_range(start + (stop - start) * 0.5, stop + (stop - start) * 0.5)
+            plot.repaint()
+
+    return run
+
+
+@benchmark('sml_export')
+def sml_export(context):
+    path = os.path.join(context['temp'], 'export.sml')
+    return lambda: export_sml(context['read_csv'], path)
+
+
+@benchmark('sml_read')
+def sml_read(context):
+    path = os.path.join(context['temp'], 'read.sml')
+    export_sml(context['read_csv'], path)
+
+    def run():
+        with SMLReader(path) as sml:
+            sml.read('samples')
+
+    return run
+
+
+@benchmark('sml_import')
+def sml_import(context):
+    path = os.path.join(context['temp'], 'import.sml')
+    output = os.path.join(context['temp'], 'import')
+    export_sml(context['read_csv'], path)
+
+    def run():
+        shutil.rmtree(output, ignore_errors=True)
+        import_sml(path, output)
+
+    return run
+
+
+def measure(func, repeat):
+    """
+    Calls ``func`` ``repeat`` times.
+
+    Returns
+    -------
+    flow  :  dict
+        ``best``, ``mean`` and every run in seconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+
+    flow = {'best': min(runs), 'mean': sum(runs) / len(runs), 'runs': runs}
+    return flow
+
+
+def compare(results, previous, threshold):
+    """
+    Prints the change of every benchmark against ``previous``.
+
+    Returns
+    -------
+    flow  :  list
+        Names of the benchmarks that got slower than ``threshold``.
+    """
+    flow = []
+    click.echo("\nCompared with {} ({})".format(previous['created'], previous['version']))
+
+    for name, result in results.items():
+        if name not in previous['results']:
+            continue
+        ratio = result['best'] / previous['results'][name]['best']
+        status = ''
+        if ratio > threshold:
+            status = 'SLOWER'
+            flow.append(name)
+        click.echo("{:<20} {:>9.4f} s -> {:>9.4f} s {:>7.2f}x {}".format(
+            name, previous['results'][name]['best'], result['best'], ratio, status))
+
+    return flow
+
+
+@click.command()
+@click.option('--samples', default=200, help="Number of synthetic samples.")
+@click.option('--time', 'time_length', default=128, help="Rows of every sample.")
+@click.option('--features', default=14, help="Columns of every sample.")
+@click.option('--repeat', default=3, help="Number of times each benchmark is run, the best time is compared.")
+@click.option('--only', multiple=True, type=click.Choice(list(BENCHMARKS)), help="Only run these benchmarks.")
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help="Where to write the results, defaults to a new file in benchmarks/results.")
+@click.option('--compare', 'previous', type=click.File('r'), default=None, help="Earlier results to compare with.")
+@click.option('--threshold', default=1.25, help="Slowdown ratio reported as a regression.")
+def main(samples, time_length, features, repeat, only, output, previous, threshold):
+    """
+    Runs the benchmarks and writes their results.
+    """
+    temp = tempfile.mkdtemp(prefix='sml-bench-')
+    try:
+        folder = os.path.join(temp, 'samples')
+        size = make_samples(folder, samples, time_length, features)
+        click.echo("{} samples of {} x {}, {:.1f} MB".format(samples, time_length, features, size / 1e6))
+
+        context = {'folder': folder, 'temp': temp, 'cache': os.path.join(temp, 'cache'), 'features': features}
+        context['read_csv'] = ReadCSV(folder, cache_dir=context['cache'])
+        context['read_csv'].read_samples()
+
+        results = {}
+        for name, setup in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(setup(context), repeat)
+            click.echo("{:<20} {:>9.4f} s best, {:>9.4f} s mean".format(
+                name, results[name]['best'], results[name]['mean']))
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+
+    flow = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'version': __version__,
+            'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'parameters': {'samples': samples, 'time_length': time_length, 'features': features, 'repeat': repeat},
+            'results': results}
+
+    if output is None:
+        os.makedirs(RESULTS, exist_ok=True)
+        output = os.path.join(RESULTS, datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(output, 'w') as f:
+        json.dump(flow, f, indent=2)
+    click.echo("Results written to " + output)
+
+    slower = []
+    if previous is not None:
+        previous = json.load(previous)
+        if previous['parameters'] != flow['parameters']:
+            click.echo("Warning: the earlier run used different parameters {}".format(previous['parameters']))
+        slower = compare(results, previous, threshold)
+
+    sys.exit(1 if slower else 0)
+
+
+if __name__ == '__main__':
+    main()
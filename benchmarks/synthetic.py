@@ -0,0 +1,74 @@
+"""
+Generates a synthetic sample folder for the benchmarks, in the same layout ``ReadCSV`` reads.
+
+Run from the root of the repository::
+
+    python benchmarks/synthetic.py /tmp/samples --samples 1000 --time 128 --features 14
+"""
+import os
+
+import click
+import numpy as np
+
+
+def make_samples(folder, samples=200, time_length=128, features=14, classes=2, seed=0):
+    """
+    Writes ``samples`` random ``sam<n>_eeg.csv`` files, ``tar_class_labels.csv`` and ``feature_names_eeg.txt`` to
+    ``folder``.
+
+    Parameters
+    ----------
+    folder: str
+        Folder to write to, it is created if it does not exist.
+    samples: int
+        Number of sample files.
+    time_length: int
+        Rows of every sample.
+    features: int
+        Columns of every sample.
+    classes: int
+        Number of class labels, assigned round robin.
+    seed: int
+        Seed of the random values.
+
+    Returns
+    -------
+    flow  :  int
+        Total size of the sample files in bytes.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.RandomState(seed)
+
+    flow = 0
+    for sample in range(1, samples + 1):
+        path = os.path.join(folder, 'sam{}_eeg.csv'.format(sample))
+        # A random walk per feature looks more like a recorded signal than white noise.
+        np.savetxt(path, rng.randn(time_length, features).cumsum(axis=0), delimiter=',', fmt='%.6f')
+        flow += os.path.getsize(path)
+
+    with open(os.path.join(folder, 'tar_class_labels.csv'), 'w') as f:
+        f.write('\n'.join(str(sample % classes + 1) for sample in range(samples)) + '\n')
+
+    with open(os.path.join(folder, 'feature_names_eeg.txt'), 'w') as f:
+        f.write('\n'.join('F{}'.format(feature) for feature in range(1, features + 1)))
+
+    return flow
+
+
+@click.command()
+@click.argument('folder', type=click.Path(file_okay=False))
+@click.option('--samples', default=200, help="Number of sample files.")
+@click.option('--time', 'time_length', default=128, help="Rows of every sample.")
+@click.option('--features', default=14, help="Columns of every sample.")
+@click.option('--classes', default=2, help="Number of class labels.")
+@click.option('--seed', default=0, help="Seed of the random values.")
+def main(folder, samples, time_length, features, classes, seed):
+    """
+    Writes a synthetic sample folder to FOLDER.
+    """
+    size = make_samples(folder, samples, time_length, features, classes, seed)
+    click.echo("Wrote {} samples, {:.1f} MB, to {}".format(samples, size / 1e6, folder))
+
+
+if __name__ == '__main__':
+    main()
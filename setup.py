@@ -28,7 +28,7 @@ setup(
     author_email='akshay@gollahalli.com',
     description='Data exporter for Spikes Markup Language (SML).',
     long_description=long_description,
-    install_requires=['click', 'pyqt>=5.6', 'numpy>=1.10', 'pandas>=0.18', 'scikit-learn>=0.17'],
+    install_requires=['click', 'pyqt>=5.6', 'numpy>=1.10', 'pandas>=0.18'],
     scripts=['sml.sh', 'sml.cmd'],
     package_data={'smlgui': ['*.ui', '*.png']},
     include_package_data=True,
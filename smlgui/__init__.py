@@ -1,4 +1,5 @@
 __name__ = "SML GUI"
 __author__ = "Akshay Raj Gollahalli"
 __version__ = '0.0.1a0'
-__all__ = ['processor', 'utility', 'main', 'widgets', 'ui']
+__all__ = ['processor', 'utility', 'main', 'widgets', 'ui', 'cache', 'workers', 'sml', 'sparse', 'encoding',
+           'profiling', 'stats', 'dtypes', 'parsing']
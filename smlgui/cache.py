@@ -0,0 +1,248 @@
+"""
+On-disk cache of parsed samples, so that a folder is only parsed once.
+
+The samples are stored as a ``.npy`` file that is opened with ``np.load(mmap_mode='r')``, next to it is a manifest
+with the names, sizes and modification times of the CSV files it was built from, and of the files the ``on_error``
+policy left out of it.
+
+Every parse writes a new generation of the ``.npy`` file, ``samples-<generation>.npy``, and the manifest names the
+current one. A file that is memory mapped cannot be replaced or removed on Windows, so the samples that are still in
+use are never overwritten, older generations are removed once nothing maps them.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+from smlgui.profiling import span
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SampleCache']
+
+CACHE_FOLDER = '.sml_cache'
+
+GENERATION = re.compile(r'^samples-(\d+)\.npy$')
+
+
+class SampleCache:
+    """Binary cache of a sample folder.
+
+    By default the cache is kept in a ``.sml_cache`` folder inside the data folder. If ``cache_dir`` is given, every
+    data folder gets its own sub-folder in it.
+    """
+
+    def __init__(self, data_folder, cache_dir=None):
+        """
+
+        Parameters
+        ----------
+        data_folder
+            Location of samples (folder location).
+        cache_dir
+            Optional folder to keep the cache in.
+        """
+        self.data_folder = os.path.abspath(data_folder)
+
+        if cache_dir is None:
+            self.cache_folder = os.path.join(self.data_folder, CACHE_FOLDER)
+        else:
+            digest = hashlib.sha1(self.data_folder.encode('utf-8')).hexdigest()
+            self.cache_folder = os.path.join(os.path.abspath(os.path.expanduser(cache_dir)), digest)
+
+        self.manifest_file = os.path.join(self.cache_folder, 'samples.json')
+        # Generation written by ``create``, until it is committed or discarded.
+        self._pending = None
+        # Files left out of the cache found by the last ``load``, with their size and modification time.
+        self.skipped = {}
+
+    def manifest(self, names, dtype, files=None, scale=None, on_error='pad', skipped=None):
+        """
+        Builds the manifest of the given sample files.
+
+        Parameters
+        ----------
+        names: list
+            Sorted sample file names.
+        dtype
+            Data type of the sample tensor.
+        files: dict
+            Optional ``(size, mtime_ns)`` of every name from an earlier scan, the files are not stat'ed again.
+        scale: float
+            Scale of ``int16`` samples, see ``dtypes``.
+        on_error: str
+            Policy the samples were parsed with, see ``parsing``.
+        skipped: dict
+            ``(size, mtime_ns)`` of the files the policy left out.
+
+        Returns
+        -------
+        flow  :  dict
+            File names, sizes and modification times along with the ``dtype``, ``scale``, policy and skipped files.
+        """
+        if files is None:
+            files = self._stat(names)
+
+        skipped = skipped or {}
+        flow = {'dtype': np.dtype(dtype).str, 'files': [[name, files[name][0], files[name][1]] for name in names],
+                'on_error': on_error, 'skipped': [[name] + list(skipped[name]) for name in sorted(skipped)]}
+        if scale is not None:
+            flow['scale'] = scale
+        return flow
+
+    def load(self, names, dtype, files=None, scale=None, on_error='pad'):
+        """
+        Opens the cached samples if they were built from the same files. Files the manifest lists as skipped are left
+        out of ``names`` as long as they did not change, they are kept in ``skipped``.
+
+        Parameters
+        ----------
+        names: list
+            Sorted sample file names, including the ones that were skipped.
+        dtype
+            Data type of the sample tensor.
+        files: dict
+            Optional ``(size, mtime_ns)`` of every name, see ``manifest``.
+        scale: float
+            Scale of ``int16`` samples.
+        on_error: str
+            Policy the samples are parsed with.
+
+        Returns
+        -------
+        flow  :  numpy.memmap, None
+            Read only memory map of the samples, ``None`` if there is no valid cache.
+        """
+        with span('cache_load'):
+            return self._load(names, dtype, files, scale, on_error)
+
+    def _load(self, names, dtype, files, scale, on_error):
+        self.skipped = {}
+        try:
+            with open(self.manifest_file, 'r') as f:
+                cached = json.load(f)
+        except (IOError, ValueError):
+            return None
+
+        if files is None:
+            files = self._stat(names)
+        skipped = {entry[0]: tuple(entry[1:]) for entry in cached.get('skipped', [])}
+        skipped = {name: files[name] for name in names if skipped.get(name) == files[name]}
+        kept = [name for name in names if name not in skipped]
+
+        samples = cached.pop('samples', None)
+        if cached != self.manifest(kept, dtype, files, scale, on_error, skipped):
+            logger.info("Sample cache at " + self.cache_folder + " is out of date.")
+            return None
+
+        try:
+            flow = np.load(os.path.join(self.cache_folder, samples), mmap_mode='r')
+        except (IOError, ValueError, TypeError):
+            return None
+
+        logger.info("Samples loaded from cache at " + self.cache_folder)
+        self.skipped = skipped
+        return flow
+
+    def _generations(self):
+        """
+        Returns the generation files in the cache folder, by generation.
+        """
+        flow = {}
+        for name in os.listdir(self.cache_folder):
+            match = GENERATION.match(name)
+            if match:
+                flow[int(match.group(1))] = os.path.join(self.cache_folder, name)
+        return flow
+
+    def _stat(self, names):
+        flow = {}
+        for name in names:
+            stat = os.stat(os.path.join(self.data_folder, name))
+            flow[name] = (stat.st_size, stat.st_mtime_ns)
+        return flow
+
+    def create(self, shape, dtype):
+        """
+        Creates a writable ``.npy`` memory map to parse the samples into.
+
+        Parameters
+        ----------
+        shape: tuple
+            Shape of the sample tensor.
+        dtype
+            Data type of the sample tensor.
+
+        Returns
+        -------
+        flow  :  numpy.memmap, None
+            Writable memory map, ``None`` if the cache folder is not writable.
+        """
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            generation = max(self._generations(), default=0) + 1
+            self._pending = os.path.join(self.cache_folder, 'samples-{}.npy'.format(generation))
+            flow = np.lib.format.open_memmap(self._pending, mode='w+', dtype=dtype, shape=shape)
+        except (IOError, OSError) as e:
+            logger.warning("Unable to create sample cache - {}".format(e))
+            return None
+
+        return flow
+
+    def commit(self, names, dtype, files=None, scale=None, on_error='pad', skipped=None):
+        """
+        Finalises a memory map created by ``create`` and writes its manifest, which names it. Older generations are
+        removed where they are no longer mapped. The memory map should be flushed and released before calling this.
+
+        Parameters
+        ----------
+        names: list
+            Sorted sample file names.
+        dtype
+            Data type of the sample tensor.
+        files: dict
+            Optional ``(size, mtime_ns)`` of every name, see ``manifest``.
+        scale: float
+            Scale of ``int16`` samples.
+        on_error: str
+            Policy the samples were parsed with.
+        skipped: dict
+            ``(size, mtime_ns)`` of the files the policy left out.
+
+        Returns
+        -------
+        flow  :  numpy.memmap
+            Read only memory map of the cached samples.
+        """
+        manifest = self.manifest(names, dtype, files, scale, on_error, skipped)
+        manifest['samples'] = os.path.basename(self._pending)
+        with open(self.manifest_file + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_file + '.tmp', self.manifest_file)
+
+        flow = np.load(self._pending, mmap_mode='r')
+        self._remove_generations(keep=self._pending)
+        self._pending = None
+        return flow
+
+    def discard(self):
+        """
+        Removes a partially written cache.
+        """
+        for path in (self._pending, self.manifest_file + '.tmp'):
+            if path is not None and os.path.isfile(path):
+                os.remove(path)
+        self._pending = None
+
+    def _remove_generations(self, keep):
+        for path in self._generations().values():
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Still memory mapped on Windows, it goes with a later commit.
+                pass
@@ -0,0 +1,116 @@
+"""
+Data types the samples can be held in.
+
+Besides ``float64`` the samples can be held as ``float32``, ``float16`` or ``int16``. ``int16`` samples are scaled,
+a stored value ``q`` stands for ``q * scale`` and ``NAN_INT16`` stands for ``nan``. Use ``dequantize`` to get the
+values back.
+
+>>> samples, clipped = convert(sample, 'int16', scale=auto_scale(sample))
+>>> dequantize(samples, scale)
+"""
+import numpy as np
+
+__all__ = ['DTYPES', 'NAN_INT16', 'resolve_dtype', 'auto_scale', 'convert', 'dequantize']
+
+DTYPES = ('float64', 'float32', 'float16', 'int16')
+
+# The most negative int16 is kept for nan, so the range is symmetric.
+NAN_INT16 = np.iinfo(np.int16).min
+INT16_MAX = np.iinfo(np.int16).max
+
+
+def resolve_dtype(dtype):
+    """
+    Returns ``dtype`` as a ``numpy.dtype``, raising a ``ValueError`` if it is not one of ``DTYPES``.
+    """
+    flow = np.dtype(dtype)
+    if flow.name not in DTYPES:
+        raise ValueError("Unsupported sample dtype {}, expected one of {}".format(flow.name, ', '.join(DTYPES)))
+    return flow
+
+
+def auto_scale(sample, headroom=2.0):
+    """
+    Returns an ``int16`` scale that fits ``headroom`` times the largest absolute value of ``sample``.
+
+    Parameters
+    ----------
+    sample
+        Values the scale is taken from, usually the first sample.
+    headroom: float
+        How much larger than in ``sample`` the values of the other samples may be before they are clipped.
+
+    Returns
+    -------
+    flow  :  float
+    """
+    sample = np.asarray(sample, dtype=np.float64)
+    peak = np.fmax.reduce(np.abs(sample), axis=None) if sample.size else np.nan
+    flow = float(peak * headroom / INT16_MAX) if np.isfinite(peak) and peak > 0 else 1.0
+    return flow
+
+
+def convert(sample, dtype, scale=None):
+    """
+    Converts ``sample`` to ``dtype``, values out of its range are clipped.
+
+    Parameters
+    ----------
+    sample
+        Float array.
+    dtype
+        One of ``DTYPES``.
+    scale: float
+        Scale of ``int16`` values.
+
+    Returns
+    -------
+    flow  :  tuple
+        The converted array and the number of values that were clipped.
+    """
+    dtype = np.dtype(dtype)
+    sample = np.asarray(sample)
+
+    if dtype.kind == 'f':
+        if dtype.itemsize >= sample.dtype.itemsize:
+            return sample.astype(dtype, copy=False), 0
+
+        limit = np.finfo(dtype).max
+        over = np.abs(sample) > limit
+        clipped = int(np.count_nonzero(over))
+        if clipped:
+            sample = np.clip(sample, -limit, limit)
+        return sample.astype(dtype), clipped
+
+    if scale is None:
+        raise ValueError("int16 samples need a scale")
+
+    missing = np.isnan(sample)
+    values = np.rint(np.where(missing, 0.0, sample) / scale)
+    over = np.abs(values) > INT16_MAX
+    clipped = int(np.count_nonzero(over))
+
+    flow = np.clip(values, -INT16_MAX, INT16_MAX).astype(np.int16)
+    flow[missing] = NAN_INT16
+    return flow, clipped
+
+
+def dequantize(array, scale=None, dtype=np.float32):
+    """
+    Returns the values of ``int16`` samples as ``dtype``, other arrays are returned as they are.
+
+    Parameters
+    ----------
+    array
+        Samples, or part of them.
+    scale: float
+        Scale of the ``int16`` values, ``None`` for float samples.
+    dtype
+        Float type of the values.
+    """
+    array = np.asarray(array)
+    if scale is None or array.dtype != np.int16:
+        return array
+
+    flow = np.where(array == NAN_INT16, dtype(np.nan), array.astype(dtype) * dtype(scale))
+    return flow
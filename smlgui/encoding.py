@@ -0,0 +1,257 @@
+"""
+Spike encoding of samples.
+
+Every encoder takes a ``(samples, time, features)`` tensor, as returned by ``ReadCSV.read_samples``, and returns a
+spike tensor of the same shape as ``int8``. The encoders only loop over time, every step is computed for all samples
+and features at once. ``nan`` values never spike and are left out of the default thresholds.
+"""
+import logging
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from smlgui.stats import SampleStats
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['threshold_encode', 'step_forward_encode', 'bsa_encode', 'encode', 'default_threshold',
+           'streaming_threshold', 'ENCODERS']
+
+# Default BSA filter, a 24 tap Hann window normalised to sum to 1.
+BSA_FILTER = np.hanning(26)[1:-1]
+BSA_FILTER /= BSA_FILTER.sum()
+
+
+def threshold_encode(data, threshold=None, factor=0.5):
+    """
+    Threshold-based representation, spikes are emitted where the signal changes by more than ``threshold`` between
+    two time steps, ``1`` for an increase and ``-1`` for a decrease.
+
+    Parameters
+    ----------
+    data
+        ``(samples, time, features)`` tensor.
+    threshold
+        Threshold per feature, defaults to ``mean + factor * std`` of the absolute change of each feature.
+    factor: float
+        Number of standard deviations used for the default threshold.
+
+    Returns
+    -------
+    flow  :  narray
+        ``int8`` spike tensor, the first time step has no spikes.
+    """
+    data = np.asarray(data)
+    diff = np.diff(data, axis=1)
+
+    if threshold is None:
+        threshold = default_threshold(data, 'threshold', factor)
+
+    flow = np.zeros(data.shape, dtype=np.int8)
+    flow[:, 1:][diff > threshold] = 1
+    flow[:, 1:][diff < -threshold] = -1
+    return flow
+
+
+def step_forward_encode(data, threshold=None, factor=0.5):
+    """
+    Step-forward encoding, a baseline follows the signal by ``threshold`` every time it emits a spike. A ``nan`` step
+    is no change, the baseline of a signal that starts with ``nan`` starts at its first value.
+
+    Parameters
+    ----------
+    data
+        ``(samples, time, features)`` tensor.
+    threshold
+        Threshold per feature, defaults to ``factor`` times the standard deviation of each feature.
+    factor: float
+        Fraction of the standard deviation used for the default threshold.
+
+    Returns
+    -------
+    flow  :  narray
+        ``int8`` spike tensor.
+    """
+    data = np.asarray(data)
+    if threshold is None:
+        threshold = default_threshold(data, 'step_forward', factor)
+    threshold = np.broadcast_to(threshold, data.shape[2:]).astype(data.dtype if data.dtype.kind == 'f' else float)
+
+    flow = np.zeros(data.shape, dtype=np.int8)
+    baseline = data[:, 0].astype(threshold.dtype)
+
+    for t in range(1, data.shape[1]):
+        value = data[:, t]
+        up = value > baseline + threshold
+        down = value < baseline - threshold
+        flow[:, t][up] = 1
+        flow[:, t][down] = -1
+        baseline += threshold * (up.astype(threshold.dtype) - down)
+
+        missing = np.isnan(baseline)
+        if missing.any():
+            baseline[missing] = value[missing]
+
+    return flow
+
+
+def bsa_encode(data, fir=BSA_FILTER, threshold=0.955):
+    """
+    Ben's Spiker Algorithm, the signal is rebuilt by convolving the spikes with ``fir``, a spike is emitted
+    whenever subtracting the filter fits the remaining signal better than leaving it.
+
+    The signal of every feature is scaled to ``[0, 1]`` first, ``nan`` values are taken as ``0``.
+
+    Parameters
+    ----------
+    data
+        ``(samples, time, features)`` tensor.
+    fir
+        FIR filter used to rebuild the signal.
+    threshold: float
+        A spike is emitted when the error with a spike is at most ``threshold`` times the error without one.
+
+    Returns
+    -------
+    flow  :  narray
+        ``int8`` spike tensor of ``0`` and ``1``.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    fir = np.asarray(fir, dtype=np.float64)
+
+    low = np.fmin.reduce(data, axis=1, keepdims=True)
+    span = np.fmax.reduce(data, axis=1, keepdims=True) - low
+    with np.errstate(invalid='ignore'):
+        signal = np.nan_to_num((data - low) / np.where(span > 0, span, 1))
+
+    length = data.shape[1]
+    taps = len(fir)
+    flow = np.zeros(data.shape, dtype=np.int8)
+
+    for t in range(length - taps + 1):
+        window = signal[:, t:t + taps]
+        error_spike = np.abs(window - fir[:, None]).sum(axis=1)
+        error_none = np.abs(window).sum(axis=1)
+
+        spike = error_spike <= error_none * threshold
+        flow[:, t][spike] = 1
+        window -= fir[:, None] * spike[:, None, :]
+
+    return flow
+
+
+ENCODERS = {
+    'threshold': threshold_encode,
+    'step_forward': step_forward_encode,
+    'bsa': bsa_encode,
+}
+
+
+def default_threshold(data, method='threshold', factor=0.5):
+    """
+    Returns the default threshold per feature of the ``threshold`` or ``step_forward`` encoder, ``nan`` values are
+    left out.
+
+    Parameters
+    ----------
+    data
+        ``(samples, time, features)`` tensor.
+    method: str
+        ``threshold`` or ``step_forward``.
+    factor: float
+        Number of standard deviations, see the encoders.
+
+    Returns
+    -------
+    flow  :  narray
+        ``nan`` for a feature without any values.
+    """
+    data = np.asarray(data)
+    values = np.abs(np.diff(data, axis=1)) if method == 'threshold' else data
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Features that are all nan.
+        flow = factor * np.nanstd(values, axis=(0, 1))
+        if method == 'threshold':
+            flow = np.nanmean(values, axis=(0, 1)) + flow
+    return flow
+
+
+def streaming_threshold(batches, method='threshold', factor=0.5):
+    """
+    Returns ``default_threshold`` over an iterable of ``(samples, time, features)`` batches, only one batch is held in
+    memory at a time. The batches can then be encoded one by one with the threshold of the whole tensor.
+
+    Returns
+    -------
+    flow  :  narray, None
+        ``None`` if there were no batches.
+    """
+    stats = None
+    for batch in batches:
+        values = np.asarray(batch, dtype=np.float64)
+        if method == 'threshold':
+            values = np.abs(np.diff(values, axis=1))
+        if stats is None:
+            stats = SampleStats(values.shape[1], values.shape[2])
+        stats.update(values)
+
+    if stats is None:
+        return None
+
+    flow = factor * stats.feature_std
+    if method == 'threshold':
+        flow = np.where(stats.feature_count > 0, stats.feature_mean, np.nan) + flow
+    return flow
+
+
+def _encode_part(method, part, options):
+    return ENCODERS[method](part, **options)
+
+
+def encode(data, method='threshold', workers=None, batch_size=1024, **options):
+    """
+    Encodes samples into spikes with one of ``ENCODERS``.
+
+    Large tensors can be split along the sample axis and encoded in a process pool. The default thresholds are
+    computed over the whole tensor first, so the result does not depend on how it is split.
+
+    Parameters
+    ----------
+    data
+        ``(samples, time, features)`` tensor.
+    method: str
+        ``threshold``, ``step_forward`` or ``bsa``.
+    workers: int
+        Number of processes, ``None`` or ``1`` encodes in this process.
+    batch_size: int
+        Number of samples sent to a process at a time.
+    options
+        Passed on to the encoder.
+
+    Returns
+    -------
+    flow  :  narray
+        ``int8`` spike tensor.
+    """
+    if method not in ENCODERS:
+        raise ValueError("Unknown encoder {}, expected one of {}".format(method, ', '.join(sorted(ENCODERS))))
+
+    data = np.asarray(data)
+    if workers is None or workers < 2 or len(data) <= batch_size:
+        return ENCODERS[method](data, **options)
+
+    if method in ('threshold', 'step_forward') and options.get('threshold') is None:
+        options['threshold'] = default_threshold(data, method, options.pop('factor', 0.5))
+
+    flow = np.empty(data.shape, dtype=np.int8)
+    starts = range(0, len(data), batch_size)
+    with ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1)) as executor:
+        parts = executor.map(_encode_part, [method] * len(starts), (data[s:s + batch_size] for s in starts),
+                             [options] * len(starts))
+        for start, part in zip(starts, parts):
+            flow[start:start + len(part)] = part
+
+    return flow
@@ -1,47 +1,79 @@
 """
 Start here.
 """
+import atexit
 import logging
+import os
 import sys
 
 import click
-from PyQt5 import QtWidgets
 
 from smlgui import __version__
-from smlgui.ui import HomeUi
-from smlgui.utility import is_windows, load_stylesheet, get_sml_conf
 
 __all__ = ['main']
 
-conf = get_sml_conf()
 
-
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option('--debug', is_flag=True, help="Verbose logging. Defaults to 0, add 1 for verbose logging.")
+@click.option('--trace', type=click.Path(dir_okay=False), default=None,
+              help="With --debug, write timing spans and counters to this Chrome trace file.")
+@click.option('--profile', type=click.Path(dir_okay=False), default=None,
+              help="With --debug, write cProfile statistics to this file.")
+@click.option('--memory', is_flag=True, help="With --debug, trace memory allocations and log the largest.")
 @click.option('--version', '-v', is_flag=True, help="Show the version number.")
-def main(debug, version):
+@click.pass_context
+def main(ctx, debug, trace, profile, memory, version):
     """
     Runs the main app. If ``--debug`` flag is added, the app runs in debug mode.
 
+    If a sub-command is given, it is run without starting the GUI.
+
     Parameters
     ----------
+    ctx: click.Context
+        Click context.
     version: bool
         Defaults to True.
     debug: bool
         Defaults to False.
+    trace: str
+        Chrome trace file written on exit, see ``smlgui.profiling``.
+    profile: str
+        ``cProfile`` statistics file written on exit.
+    memory: bool
+        Logs the largest memory allocations on exit.
     """
-    global conf
+    if (trace or profile or memory) and not debug:
+        raise click.UsageError("--trace, --profile and --memory need --debug")
 
     if debug:
         logging.basicConfig(level=logging.DEBUG,
                             format='%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d [%(threadName)s]: %('
                                    'message)s')
+        from smlgui.profiling import start, stop
+        start(trace, profile, memory)
+        atexit.register(stop)
     elif version:
         click.echo("Version " + __version__)
         sys.exit()
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
 
+    if ctx.invoked_subcommand is None:
+        start_gui()
+
+
+def start_gui():
+    """
+    Starts the GUI.
+    """
+    from PyQt5 import QtWidgets
+
+    from smlgui.ui import HomeUi
+    from smlgui.utility import is_windows, load_stylesheet, get_sml_conf
+
+    conf = get_sml_conf()
+
     if is_windows():
         import ctypes
         my_app_id = 'gollahalli.sml_gui.' + __version__
@@ -56,3 +88,55 @@ def main(debug, version):
         app.setStyleSheet("")
 
     sys.exit(app.exec_())
+
+
+@main.command('export')
+@click.argument('folder', type=click.Path(exists=True, file_okay=False))
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help="SML file to write.")
+@click.option('--workers', '-w', type=int, default=None, help="Number of workers used to parse the samples.")
+@click.option('--encode', 'method', type=click.Choice(['threshold', 'step_forward', 'bsa']), default=None,
+              help="Also spike encode the samples.")
+@click.option('--dtype', type=click.Choice(['float64', 'float32', 'float16', 'int16']), default='float64',
+              help="Type the samples are exported as, int16 samples are scaled.")
+@click.option('--scale', type=float, default=None,
+              help="Value of one step of int16 samples, taken from the first sample by default.")
+@click.option('--on-error', type=click.Choice(['pad', 'skip', 'fail']), default='pad',
+              help="Pad malformed sample files with nan, skip them or stop the export.")
+def export_command(folder, output, workers, method, dtype, scale, on_error):
+    """
+    Exports a folder of sam_*.csv files to an SML file.
+    """
+    from smlgui.parsing import SampleFormatError
+    from smlgui.processor import export_sml
+    from smlgui.utility import ReadCSV
+
+    if scale is not None and scale <= 0:
+        raise click.BadParameter("should be positive", param_hint='--scale')
+
+    encoding = {'method': method, 'workers': workers} if method else None
+    try:
+        export_sml(ReadCSV(folder, workers=workers, dtype=dtype, scale=scale, on_error=on_error), output,
+                   encoding=encoding)
+    except SampleFormatError as e:
+        raise click.ClickException(str(e))
+
+
+@main.command('import')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--to', 'to', type=click.Choice(['csv']), default='csv', help="Format to convert to.")
+@click.option('--output', '-o', type=click.Path(file_okay=False), default=None,
+              help="Folder to write to, defaults to the SML file name without its extension.")
+def import_command(file, to, output):
+    """
+    Imports an SML file and converts it to CSV files.
+    """
+    from smlgui.processor import import_sml
+    from smlgui.sml import SMLFormatError
+
+    if output is None:
+        output = os.path.splitext(file)[0]
+
+    try:
+        import_sml(file, output)
+    except SMLFormatError as e:
+        raise click.ClickException(str(e))
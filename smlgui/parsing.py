@@ -0,0 +1,227 @@
+"""
+Parsing of sample files that may not be well formed.
+
+The format of a folder is sniffed once from the start of its first sample file, its delimiter, whether it has a
+header row and whether its rows end with a delimiter. Every file is then parsed with ``np.loadtxt`` in that format.
+Only a file that ``np.loadtxt`` cannot read, or that does not have the expected shape, is read again line by line to
+find out what is wrong with it. A file with values out of the range of the type the samples are held in has a problem
+too. What happens to such a file depends on the policy:
+
+- ``pad`` - Bad and missing values are ``nan``, short rows and samples are padded with ``nan``, long ones are cut,
+  values out of range are clipped.
+- ``skip`` - The file is left out of the samples.
+- ``fail`` - ``SampleFormatError`` is raised.
+
+Each problem is reported as an ``Issue`` with the file, line and column it was found at.
+
+>>> sample, issues = parse_sample('sam1_eeg.csv', shape=(128, 14), on_error='skip')
+>>> print(format_issues(issues))
+"""
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from smlgui.dtypes import convert
+
+__all__ = ['SampleFormat', 'Issue', 'POLICIES', 'DEFAULT_FORMAT', 'sniff_format', 'parse_sample', 'format_issues',
+           'SampleFormatError']
+
+POLICIES = ('pad', 'skip', 'fail')
+
+# Candidates in order of preference, ``None`` splits on whitespace. Commas come last so that a decimal comma is not
+# taken for the delimiter of a ``;`` separated file.
+DELIMITERS = ('\t', ';', ',')
+
+SampleFormat = namedtuple('SampleFormat', ['delimiter', 'header', 'trailing'])
+SampleFormat.__doc__ = """
+Format of a sample file, ``delimiter`` is ``None`` for whitespace, ``header`` is the number of header rows and
+``trailing`` is ``True`` if every row ends with a delimiter.
+"""
+
+Issue = namedtuple('Issue', ['file', 'line', 'column', 'message'])
+Issue.__doc__ = """
+A problem with a sample file. ``line`` and ``column`` count from 1, they are ``None`` if the problem is not with a
+single line or column.
+"""
+
+DEFAULT_FORMAT = SampleFormat(',', 0, False)
+
+
+def sniff_format(block, lines=20):
+    """
+    Works out the format of a sample file from its first bytes.
+
+    Parameters
+    ----------
+    block: bytes
+        Start of the file.
+    lines: int
+        Number of lines looked at.
+
+    Returns
+    -------
+    flow  :  SampleFormat
+    """
+    text = block.decode('latin-1').split('\n')
+    if len(text) > 1:
+        text = text[:-1]  # The last line may be cut short.
+    text = [line.rstrip('\r') for line in text if line.strip()][:lines]
+    if not text:
+        return DEFAULT_FORMAT
+
+    delimiter = next((candidate for candidate in DELIMITERS if all(candidate in line for line in text)), None)
+    if delimiter is None and not all(len(line.split()) > 1 for line in text):
+        delimiter = ','
+
+    header = int(len(text) > 1 and not _is_numeric(_cells(text[0], delimiter)) and
+                 _is_numeric(_cells(text[1], delimiter)))
+
+    rows = text[header:]
+    trailing = delimiter is not None and bool(rows) and all(line.rstrip().endswith(delimiter) for line in rows)
+
+    flow = SampleFormat(delimiter, header, trailing)
+    return flow
+
+
+def parse_sample(path, shape=None, fmt=DEFAULT_FORMAT, on_error='pad', dtype=None, scale=None):
+    """
+    Parses a single sample file, see the module for how problems are handled.
+
+    Parameters
+    ----------
+    path: str
+        Absolute path of the CSV file.
+    shape: tuple
+        Expected ``(time, features)`` shape, anything is accepted if ``None``.
+    fmt: SampleFormat
+        Format of the file, see ``sniff_format``.
+    on_error: str
+        One of ``POLICIES``.
+    dtype
+        Type the sample is converted to with ``dtypes.convert``, it is kept as ``float64`` if ``None``.
+    scale: float
+        Scale of ``int16`` samples.
+
+    Returns
+    -------
+    flow  :  tuple
+        2D array of the sample, ``None`` if it was skipped, and the list of ``Issue`` found.
+
+    Raises
+    ------
+    SampleFormatError
+        If the file has a problem and ``on_error`` is ``fail``.
+    """
+    if on_error not in POLICIES:
+        raise ValueError("Unknown policy {}, expected one of {}".format(on_error, ', '.join(POLICIES)))
+
+    usecols = range(shape[1]) if fmt.trailing and shape is not None else None
+    issues = None
+    try:
+        flow = np.loadtxt(path, delimiter=fmt.delimiter, skiprows=fmt.header, usecols=usecols, ndmin=2)
+    except ValueError:
+        pass
+    else:
+        if shape is None or flow.shape == tuple(shape):
+            issues = []
+
+    if issues is None:
+        flow, issues = _validate(path, shape, fmt)
+
+    if dtype is not None:
+        flow, clipped = convert(flow, dtype, scale)
+        if clipped:
+            message = "{} values out of the range of {}".format(clipped, np.dtype(dtype).name)
+            issues.append(Issue(path, None, None, message))
+
+    if issues and on_error == 'fail':
+        raise SampleFormatError("{} is malformed\n{}".format(path, format_issues(issues)), issues)
+    if issues and on_error == 'skip':
+        flow = None
+    return flow, issues
+
+
+def _validate(path, shape, fmt):
+    """
+    Reads a sample file line by line, returns it padded to ``shape`` along with its issues.
+    """
+    issues = []
+    rows = []
+    with open(path, 'r', newline='', errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if number <= fmt.header or not line.strip():
+                continue
+
+            cells = _cells(line, fmt.delimiter)
+            if fmt.trailing and len(cells) > 1 and not cells[-1].strip():
+                cells.pop()
+
+            values = []
+            for column, cell in enumerate(cells, 1):
+                try:
+                    values.append(float(cell))
+                except ValueError:
+                    values.append(np.nan)
+                    message = "bad value {!r}".format(cell.strip()) if cell.strip() else "missing value"
+                    issues.append(Issue(path, number, column, message))
+            rows.append((number, values))
+
+    if shape is None:
+        lengths = Counter(len(values) for number, values in rows)
+        shape = (len(rows), lengths.most_common(1)[0][0] if lengths else 0)
+
+    for number, values in rows:
+        if len(values) != shape[1]:
+            issues.append(Issue(path, number, None, "{} values, expected {}".format(len(values), shape[1])))
+    if len(rows) != shape[0]:
+        issues.append(Issue(path, None, None, "{} rows, expected {}".format(len(rows), shape[0])))
+
+    flow = np.full(shape, np.nan)
+    for row, (number, values) in enumerate(rows[:shape[0]]):
+        values = values[:shape[1]]
+        flow[row, :len(values)] = values
+
+    return flow, issues
+
+
+def format_issues(issues, limit=20):
+    """
+    Formats issues one per line as ``file:line:column: message``, after ``limit`` of them only their number is
+    given.
+    """
+    lines = []
+    for issue in issues[:limit]:
+        place = ':'.join(str(part) for part in (issue.file, issue.line, issue.column) if part is not None)
+        lines.append("{}: {}".format(place, issue.message))
+    if len(issues) > limit:
+        lines.append("... and {} more".format(len(issues) - limit))
+
+    flow = '\n'.join(lines)
+    return flow
+
+
+def _cells(line, delimiter):
+    return line.split(delimiter) if delimiter is not None else line.split()
+
+
+def _is_numeric(cells):
+    try:
+        [float(cell) for cell in cells if cell.strip()]
+    except ValueError:
+        return False
+    return True
+
+
+####################################################################
+#                                                                  #
+#                           Exceptions                             #
+#                                                                  #
+####################################################################
+
+
+class SampleFormatError(Exception):
+    def __init__(self, message, errors=None):
+        super(SampleFormatError, self).__init__(message)
+
+        self.errors = errors
@@ -1,11 +1,22 @@
 """
 Processes the selected files - Reads the samples and other specified files the converts it into an SML file.
+
+Nothing in here imports PyQt5, so it can be used from the command line on machines without a display.
 """
 import logging
+import os
+
+import numpy as np
+
+from smlgui.dtypes import dequantize
+from smlgui.encoding import encode, streaming_threshold
+from smlgui.profiling import span, count
+from smlgui.sml import SMLReader, SMLWriter
+from smlgui.sparse import SparseArray
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['check_files']
+__all__ = ['check_files', 'export_sml', 'import_sml', 'samples_to_csv', 'section_to_csv', 'write_csv']
 
 
 def check_files(location):
@@ -21,3 +32,286 @@ def check_files(location):
         logger.info("Path selected: " + location)
     else:
         logger.info("No path provided")
+
+
+@span('export_sml')
+def export_sml(read_csv, output, batch_size=256, feature_names=None, network=None, weights=None, spikes=None,
+               settings=None, encoding=None, progress=None):
+    """
+    Writes the samples of a folder to an SML file.
+
+    The samples are streamed to the ``samples`` section ``batch_size`` at a time, so only one batch is held in
+    memory, in the ``dtype`` of ``read_csv``. The network, weights and spikes are written to the ``connections``,
+    ``weights`` and ``spikes`` sections, ``SparseArray`` as sparse sections. The class labels, feature names, settings
+    and the scale of ``int16`` samples are kept in the file's metadata. The file only appears at ``output`` once it has
+    been completely written.
+
+    Parameters
+    ----------
+    read_csv: ReadCSV
+        Folder of samples to export.
+    output: str
+        Path of the SML file.
+    batch_size: int
+        Number of samples read at a time.
+    feature_names: list
+        Feature names, defaults to the ones found by ``ReadCSV.get_feature_names``.
+    network
+        Connections of the network as a 2D array or ``SparseArray``.
+    weights
+        Weights of the network as an array or ``SparseArray``.
+    spikes: SparseArray
+        Spike trains.
+    settings: dict
+        Neuron type, learning type and any other settings to record.
+    encoding: dict
+        If given, the samples are also spike encoded with ``encoding.encode`` and written to the sparse ``encoded``
+        section a batch at a time. The dictionary holds the ``method`` and the encoder's options, it is recorded in
+        the metadata. A default threshold is computed over all samples first, in a separate pass over them, which
+        parses the samples twice if ``read_csv`` does not cache them.
+    progress
+        Optional callable, called as ``progress(samples_written, total_samples)`` after every batch. Returning
+        ``False`` cancels the export.
+
+    Raises
+    ------
+    ExportCancelled
+        If ``progress`` returned ``False``.
+    """
+    shape = read_csv.time_feature_length()
+    total = read_csv.sample_size()
+    scale = read_csv.sample_scale()
+
+    if feature_names is None:
+        feature_names = read_csv.get_feature_names()['name_features']
+
+    with SMLWriter(output) as sml:
+        sml.meta['feature_names'] = list(feature_names)
+        sml.meta['settings'] = dict(settings or {})
+        if scale is not None:
+            sml.meta['scale'] = scale
+
+        for name, array in (('connections', network), ('weights', weights), ('spikes', spikes)):
+            if isinstance(array, SparseArray):
+                sml.add_sparse(name, array)
+            elif array is not None:
+                sml.add_array(name, array)
+
+        encoded = options = None
+        if encoding is not None:
+            encoding = dict(encoding)
+            sml.meta['encoding'] = encoding
+            options = _encoding_options(read_csv, encoding, batch_size, scale)
+            encoded = sml.begin_sparse('encoded', np.int8, (total, shape['time_length'], shape['feature_length']))
+
+        section = sml.begin_section('samples', read_csv.dtype, (shape['time_length'], shape['feature_length']))
+        written = 0
+        for batch in read_csv.iter_samples(batch_size=batch_size):
+            section.write(batch)
+            if encoded is not None:
+                with span('encode', method=options['method'], samples=len(batch)):
+                    spikes = SparseArray.from_dense(encode(dequantize(batch, scale), **options))
+                spikes.coords[0] += written
+                encoded.write(spikes.coords, spikes.values)
+
+            written += len(batch)
+            count('samples_exported', len(batch))
+            if progress is not None and progress(written, total) is False:
+                raise ExportCancelled("Export cancelled after {} of {} samples".format(written, total))
+        section.end()
+
+        if encoded is not None:
+            encoded.end()
+            sml.sections['encoded']['shape'][0] = written  # Files may have been skipped.
+
+        # Only known once the samples are read, files may have been skipped.
+        sml.meta['class_labels'] = read_csv._get_class_labels()
+
+    logger.info("Exported {} samples to {}".format(written, output))
+
+
+def _encoding_options(read_csv, encoding, batch_size, scale):
+    """
+    Returns the options ``export_sml`` encodes every batch with, with the default threshold computed over all the
+    samples of ``read_csv``.
+    """
+    flow = dict(encoding)
+    flow.setdefault('method', 'threshold')
+    if flow['method'] in ('threshold', 'step_forward') and flow.get('threshold') is None:
+        with span('threshold', method=flow['method']):
+            batches = (dequantize(batch, scale) for batch in read_csv.iter_samples(batch_size=batch_size))
+            flow['threshold'] = streaming_threshold(batches, flow['method'], flow.pop('factor', 0.5))
+    return flow
+
+
+def import_sml(path, output):
+    """
+    Writes the contents of an SML file to a folder of CSV files that ``ReadCSV`` can read back.
+
+    Every sample is written to ``sam<number>_eeg.csv``, the class labels to ``tar_class_labels.csv`` and the feature
+    names to ``feature_names_eeg.txt``.
+
+    Parameters
+    ----------
+    path: str
+        Path of the SML file.
+    output: str
+        Folder to write the CSV files to, it is created if it does not exist.
+    """
+    with SMLReader(path) as sml:
+        number = samples_to_csv(sml, output)
+
+        if 'class_labels' in sml.meta:
+            np.savetxt(os.path.join(output, 'tar_class_labels.csv'), sml.meta['class_labels'], fmt='%d')
+
+        if 'feature_names' in sml.meta:
+            with open(os.path.join(output, 'feature_names_eeg.txt'), 'w') as f:
+                f.write('\n'.join(sml.meta['feature_names']))
+
+    logger.info("Imported {} samples to {}".format(number, output))
+
+
+@span('samples_to_csv')
+def samples_to_csv(sml, output, name='samples', progress=None):
+    """
+    Writes every sample of a 3D section to its own ``sam<number>_eeg.csv`` file, ``int16`` samples are scaled back
+    to their values.
+
+    Parameters
+    ----------
+    sml: SMLReader
+        Opened SML file.
+    output: str
+        Folder to write the CSV files to, it is created if it does not exist.
+    name: str
+        Name of the section.
+    progress
+        Optional callable, called as ``progress(samples_written, total_samples)`` after every chunk. Returning
+        ``False`` cancels the export.
+
+    Returns
+    -------
+    flow  :  int
+        Number of samples written.
+
+    Raises
+    ------
+    ExportCancelled
+        If ``progress`` returned ``False``.
+    """
+    if not os.path.isdir(output):
+        os.makedirs(output)
+
+    total = sml.shape(name)[0]
+    scale = sml.meta.get('scale') if name == 'samples' else None
+    flow = 0
+    for chunk in sml.iter_chunks(name):
+        for sample in dequantize(chunk, scale, np.float64):
+            flow += 1
+            with open(os.path.join(output, 'sam{}_eeg.csv'.format(flow)), 'w') as f:
+                write_csv(f, sample)
+        if progress is not None and progress(flow, total) is False:
+            raise ExportCancelled("Export cancelled after {} of {} samples".format(flow, total))
+
+    return flow
+
+
+@span('section_to_csv')
+def section_to_csv(sml, name, output, progress=None):
+    """
+    Writes a section to a single CSV file, a chunk at a time. Any dimension after the second is flattened into the
+    columns. A sparse section is written as one row per non-zero entry, its coordinates followed by its value. The
+    ``samples`` section is scaled back to its values if it is ``int16``.
+
+    Parameters
+    ----------
+    sml: SMLReader
+        Opened SML file.
+    name: str
+        Name of the section.
+    output: str
+        Path of the CSV file, a cancelled export removes it.
+    progress
+        Optional callable, called as ``progress(rows_written, total_rows)`` after every chunk. Returning ``False``
+        cancels the export.
+
+    Returns
+    -------
+    flow  :  int
+        Number of rows written.
+
+    Raises
+    ------
+    ExportCancelled
+        If ``progress`` returned ``False``.
+    """
+    if sml.is_sparse(name):
+        coords = sml.section(name + '/coords')
+        values = sml.section(name + '/values')
+        total = len(values)
+        chunk_rows = sml.sections[name + '/values']['chunk_rows']
+        chunks = (np.column_stack([coords[start:start + chunk_rows], values[start:start + chunk_rows]])
+                  for start in range(0, total, chunk_rows))
+    else:
+        total = sml.shape(name)[0]
+        scale = sml.meta.get('scale') if name == 'samples' else None
+        chunks = (dequantize(chunk, scale, np.float64) for chunk in sml.iter_chunks(name))
+
+    flow = 0
+    try:
+        with open(output, 'w') as f:
+            for chunk in chunks:
+                write_csv(f, chunk.reshape(len(chunk), -1))
+                flow += len(chunk)
+                if progress is not None and progress(flow, total) is False:
+                    raise ExportCancelled("Export cancelled after {} of {} rows".format(flow, total))
+    except ExportCancelled:
+        os.remove(output)
+        raise
+
+    return flow
+
+
+def write_csv(f, array, block_cells=1 << 16):
+    """
+    Writes a 2D array to an open text file as comma separated values.
+
+    Rather than formatting cell by cell, a whole block of rows is formatted with a single ``%`` operation.
+    Floats are written with ``%.17g``, which reads back to the same value.
+
+    Parameters
+    ----------
+    f: file
+        File opened for writing text.
+    array
+        1D or 2D array, a 1D array is written as a column.
+    block_cells: int
+        Approximate number of cells formatted at a time.
+    """
+    array = np.asarray(array)
+    if array.ndim == 1:
+        array = array.reshape(-1, 1)
+    if not array.size:
+        return
+
+    cell = '%d' if array.dtype.kind in 'iub' else '%.17g'
+    row = ','.join([cell] * array.shape[1]) + '\n'
+    rows = max(1, block_cells // array.shape[1])
+
+    for start in range(0, len(array), rows):
+        block = array[start:start + rows]
+        f.write((row * len(block)) % tuple(block.ravel().tolist()))
+
+
+####################################################################
+#                                                                  #
+#                           Exceptions                             #
+#                                                                  #
+####################################################################
+
+
+class ExportCancelled(Exception):
+    def __init__(self, message, errors=None):
+        super(ExportCancelled, self).__init__(message)
+
+        self.errors = errors
@@ -0,0 +1,206 @@
+"""
+Timing spans and counters, to find out where a slow load spends its time.
+
+Nothing is recorded until ``start`` is called, ``sml --debug`` does this from the command line. Every span is logged
+at debug level, with ``--trace trace.json`` the spans and counters are also written as a Chrome trace, which can be
+opened in ``chrome://tracing`` or https://ui.perfetto.dev. ``start`` can also run ``cProfile`` and ``tracemalloc``
+until ``stop``. The profile covers every thread started with ``threading``, such as the parse pool's, code run on
+other threads is profiled within ``profiled``.
+
+>>> with span('parse', files=10):
+>>>     # Do something
+>>>     count('bytes_read', 1024)
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['start', 'stop', 'is_enabled', 'profiled', 'span', 'count', 'counters']
+
+_lock = threading.Lock()
+_state = None
+
+
+def start(trace=None, profile=None, memory=False):
+    """
+    Starts recording spans and counters.
+
+    Parameters
+    ----------
+    trace: str
+        Path of the Chrome trace written by ``stop``.
+    profile: str
+        Path of the ``cProfile`` statistics written by ``stop``. The thread that calls ``start`` and the threads
+        started after it are profiled, the statistics of all of them are added up.
+    memory: bool
+        Trace memory allocations with ``tracemalloc`` and log the largest ones on ``stop``.
+    """
+    global _state
+
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    _state = {'origin': time.perf_counter(), 'pid': os.getpid(), 'events': [], 'counters': {}, 'threads': {},
+              'trace': trace, 'profile': profile, 'profilers': [], 'memory': memory}
+
+    if profile:
+        _enable_profiler()
+        threading.setprofile(_on_thread_start)
+
+
+def stop():
+    """
+    Stops recording and writes the trace, profile and memory report asked for by ``start``.
+
+    Returns
+    -------
+    flow  :  dict, None
+        The Chrome trace, ``None`` if nothing was being recorded.
+    """
+    global _state
+
+    state, _state = _state, None
+    if state is None:
+        return None
+
+    if state['profile']:
+        import pstats
+        threading.setprofile(None)
+        with _lock:
+            profilers = list(state['profilers'])
+        for profiler in profilers:
+            profiler.disable()
+        stats = pstats.Stats(*profilers)
+        stats.dump_stats(state['profile'])
+        logger.info("Profile written to " + state['profile'])
+
+    if state['memory']:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        logger.info("Traced memory {:.1f} MB, peak {:.1f} MB".format(current / 1e6, peak / 1e6))
+        for stat in snapshot.statistics('lineno')[:20]:
+            logger.info("    {}".format(stat))
+
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': state['pid'], 'tid': tid, 'args': {'name': name}}
+              for tid, name in state['threads'].items()]
+    flow = {'traceEvents': events + state['events'], 'displayTimeUnit': 'ms',
+            'otherData': {'counters': state['counters']}}
+
+    if state['trace']:
+        with open(state['trace'], 'w') as f:
+            json.dump(flow, f)
+        logger.info("Trace of {} events written to {}".format(len(state['events']), state['trace']))
+
+    return flow
+
+
+@contextmanager
+def profiled():
+    """
+    Profiles the enclosed block if ``start`` was asked for a profile. Threads started with ``threading`` are profiled
+    as a whole, this is for code run on other threads, such as a ``QThread``.
+    """
+    profiler = _enable_profiler()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+
+def _enable_profiler():
+    """
+    Profiles the calling thread with a new profiler, returns it or ``None`` if it is not profiled.
+    """
+    state = _state
+    if state is None or not state['profile'] or sys.getprofile() is not None:
+        return None
+
+    import cProfile
+    flow = cProfile.Profile()
+    try:
+        flow.enable()
+    except ValueError:
+        # Since Python 3.12 there is a single profiler, the first one already sees every thread.
+        return None
+
+    with _lock:
+        state['profilers'].append(flow)
+    return flow
+
+
+def _on_thread_start(frame, event, arg):
+    # Installed with ``threading.setprofile``, called on the first event of every new thread.
+    sys.setprofile(None)
+    _enable_profiler()
+
+
+def is_enabled():
+    """
+    Returns ``True`` between ``start`` and ``stop``.
+    """
+    return _state is not None
+
+
+@contextmanager
+def span(name, **args):
+    """
+    Times the enclosed block, or function when used as a decorator. Does nothing unless ``start`` was called.
+
+    Parameters
+    ----------
+    name: str
+        Name of the span.
+    args
+        Details shown with the span, they have to be JSON serialisable.
+    """
+    state = _state
+    if state is None:
+        yield
+        return
+
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        thread = threading.current_thread()
+        event = {'name': name, 'ph': 'X', 'ts': (begin - state['origin']) * 1e6, 'dur': (end - begin) * 1e6,
+                 'pid': state['pid'], 'tid': thread.ident, 'args': args}
+        with _lock:
+            state['events'].append(event)
+            state['threads'][thread.ident] = thread.name
+        logger.debug("{} took {:.2f} ms {}".format(name, (end - begin) * 1000, args))
+
+
+def count(name, value=1):
+    """
+    Adds ``value`` to the counter ``name``. Does nothing unless ``start`` was called.
+    """
+    state = _state
+    if state is None:
+        return
+
+    with _lock:
+        total = state['counters'][name] = state['counters'].get(name, 0) + value
+        state['events'].append({'name': name, 'ph': 'C', 'ts': (time.perf_counter() - state['origin']) * 1e6,
+                                'pid': state['pid'], 'args': {name: total}})
+
+
+def counters():
+    """
+    Returns the totals of all counters since ``start``.
+    """
+    state = _state
+    flow = dict(state['counters']) if state is not None else {}
+    return flow
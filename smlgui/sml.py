@@ -0,0 +1,627 @@
+"""
+Reads and writes SML files.
+
+An SML file is a binary container of named sections, each section is an N-dimensional array stored as chunks of
+rows along its first axis. The layout is::
+
+    header      magic b'SML\\x00', version (uint16), flags (uint16), index offset (uint64), index length (uint64)
+    chunks      raw or compressed bytes of every chunk, section after section
+    index       UTF-8 JSON, the sections with their dtype, shape and chunk offsets, and the file's metadata
+
+A sparse section stores the coordinates and values of its non-zero entries in two sub-sections.
+
+The index is written last, so a section can be streamed to disk without knowing its length beforehand, and a reader
+only has to parse the header and the index to seek straight to any section or chunk.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from smlgui.sparse import SparseArray
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SMLWriter', 'SMLReader', 'Section', 'SECTIONS']
+
+MAGIC = b'SML\x00'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQ')
+
+# Sections written by SML Maker.
+SECTIONS = ('samples', 'encoded', 'spikes', 'weights', 'connections')
+
+# Codec name: (compress, decompress)
+CODECS = {
+    'none': (bytes, bytes),
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class SMLWriter:
+    """
+    Writes an SML file.
+
+    The file is written to a temporary file next to ``path``, which is synced to disk and renamed to ``path`` by
+    ``close``. If the writer is aborted, or an exception leaves the ``with`` block, ``path`` is left untouched.
+
+    >>> with SMLWriter('data.sml') as sml:
+    >>>     sml.add_array('weights', weights)
+    >>>     section = sml.begin_section('samples', np.float64, (128, 14))
+    >>>     for batch in read_csv.iter_samples(batch_size=100):
+    >>>         section.write(batch)
+    >>>     sml.meta['class_labels'] = [1, 2, 1]
+    """
+
+    def __init__(self, path, compression='zlib', chunk_bytes=CHUNK_BYTES):
+        """
+
+        Parameters
+        ----------
+        path
+            Path of the SML file.
+        compression
+            Codec used for every chunk, ``zlib`` or ``none``.
+        chunk_bytes
+            Approximate size of a chunk before compression.
+        """
+        if compression not in CODECS:
+            raise SMLFormatError("Unknown compression " + str(compression))
+
+        self.path = path
+        self.compression = compression
+        self.chunk_bytes = chunk_bytes
+        self.meta = {}
+        self.sections = {}
+        self._open = []
+
+        folder, name = os.path.split(os.path.abspath(path))
+        self.temp_path = os.path.join(folder, '.{}.{}.tmp'.format(name, os.getpid()))
+        self._file = open(self.temp_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def begin_section(self, name, dtype, row_shape=()):
+        """
+        Starts a section whose rows are written with ``SectionWriter.write``.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        dtype
+            Data type of the array.
+        row_shape: tuple
+            Shape of a row, i.e. the array's shape without its first axis.
+
+        Returns
+        -------
+        flow  :  SectionWriter
+        """
+        if name in self.sections:
+            raise SMLFormatError("Section {} already written".format(name))
+
+        dtype = np.dtype(dtype)
+        row_bytes = max(1, dtype.itemsize * int(np.prod(row_shape, dtype=np.int64)))
+        self.sections[name] = {'dtype': dtype.str, 'shape': [0] + list(row_shape), 'compression': self.compression,
+                               'chunk_rows': max(1, self.chunk_bytes // row_bytes), 'chunks': []}
+
+        flow = SectionWriter(self, name)
+        self._open.append(flow)
+        return flow
+
+    def add_array(self, name, array):
+        """
+        Writes a whole array as a section.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        array
+            Array to write.
+        """
+        array = np.asarray(array)
+        if array.ndim == 0:
+            array = array.reshape(1)
+
+        section = self.begin_section(name, array.dtype, array.shape[1:])
+        section.write(array)
+        section.end()
+
+    def begin_sparse(self, name, dtype, shape):
+        """
+        Starts a sparse section whose entries are written with ``SparseSectionWriter.write``.
+
+        The coordinates and values are kept in two sub-sections, ``<name>/coords`` and ``<name>/values``.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        dtype
+            Data type of the values.
+        shape: tuple
+            Shape of the dense array.
+
+        Returns
+        -------
+        flow  :  SparseSectionWriter
+        """
+        if name in self.sections:
+            raise SMLFormatError("Section {} already written".format(name))
+
+        self.sections[name] = {'kind': 'sparse', 'dtype': np.dtype(dtype).str, 'shape': list(shape), 'nnz': 0}
+        coords = self.begin_section(name + '/coords', np.int64, (len(shape),))
+        values = self.begin_section(name + '/values', dtype)
+        self.sections[name + '/coords']['parent'] = name
+        self.sections[name + '/values']['parent'] = name
+
+        flow = SparseSectionWriter(self.sections[name], coords, values)
+        return flow
+
+    def add_sparse(self, name, array):
+        """
+        Writes a ``SparseArray`` as a sparse section.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        array: SparseArray
+            Array to write.
+        """
+        section = self.begin_sparse(name, array.dtype, array.shape)
+        section.write(array.coords, array.values)
+        section.end()
+
+    def close(self):
+        """
+        Writes the index and the header, syncs the file to disk and moves it to ``path``.
+        """
+        if self._file.closed:
+            return
+        for section in list(self._open):
+            section.end()
+
+        try:
+            index = json.dumps({'sections': self.sections, 'meta': self.meta}).encode('utf-8')
+            offset = self._file.tell()
+            self._file.write(index)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, VERSION, 0, offset, len(index)))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+        _sync_folder(os.path.dirname(os.path.abspath(self.path)))
+
+    def abort(self):
+        """
+        Closes and removes the temporary file without touching ``path``.
+        """
+        self._open = []
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def _write_chunk(self, name, rows):
+        section = self.sections[name]
+        raw = np.ascontiguousarray(rows, dtype=section['dtype']).tobytes()
+        data = CODECS[section['compression']][0](raw)
+
+        section['chunks'].append([self._file.tell(), len(data), len(rows)])
+        section['shape'][0] += len(rows)
+        self._file.write(data)
+
+
+def _sync_folder(folder):
+    """
+    Syncs a folder so that a rename in it survives a crash, where the OS supports it.
+    """
+    try:
+        descriptor = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class SectionWriter:
+    """
+    Streams the rows of a section to an ``SMLWriter``, buffering them into chunks of ``chunk_rows``.
+    """
+
+    def __init__(self, writer, name):
+        self.writer = writer
+        self.name = name
+        self._info = writer.sections[name]
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, rows):
+        """
+        Appends rows to the section.
+
+        Parameters
+        ----------
+        rows
+            Array whose shape, without the first axis, is the section's row shape.
+        """
+        rows = np.asarray(rows, dtype=self._info['dtype'])
+        if list(rows.shape[1:]) != self._info['shape'][1:]:
+            raise SMLFormatError("Rows of shape {} do not fit section {} of row shape {}".format(
+                rows.shape[1:], self.name, tuple(self._info['shape'][1:])))
+
+        chunk_rows = self._info['chunk_rows']
+        while len(rows):
+            take = min(chunk_rows - self._buffered, len(rows))
+            self._buffer.append(rows[:take])
+            self._buffered += take
+            rows = rows[take:]
+            if self._buffered == chunk_rows:
+                self._flush()
+
+    def end(self):
+        """
+        Writes the rows that are still buffered and ends the section.
+        """
+        if self not in self.writer._open:
+            return
+        self._flush()
+        self.writer._open.remove(self)
+
+    def _flush(self):
+        if self._buffered:
+            self.writer._write_chunk(self.name, np.concatenate(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+
+class SparseSectionWriter:
+    """
+    Streams the entries of a sparse section to an ``SMLWriter``.
+    """
+
+    def __init__(self, info, coords, values):
+        self._info = info
+        self._coords = coords
+        self._values = values
+
+    def write(self, coords, values):
+        """
+        Appends entries to the section, the entries of the whole section should end up in row-major order.
+
+        Parameters
+        ----------
+        coords
+            Coordinates as an ``(ndim, n)`` integer array.
+        values
+            Values as a 1D array of length ``n``.
+        """
+        coords = np.asarray(coords, dtype=np.int64)
+        self._coords.write(coords.T)
+        self._values.write(values)
+        self._info['nnz'] += coords.shape[1]
+
+    def end(self):
+        """
+        Ends the section.
+        """
+        self._coords.end()
+        self._values.end()
+
+
+class SMLReader:
+    """
+    Reads an SML file.
+
+    Only the header and index are read when the file is opened, a section's chunks are read when it is asked for.
+    ``section`` returns an array like view of a section that reads the chunks it is indexed with.
+
+    >>> with SMLReader('data.sml') as sml:
+    >>>     weights = sml.read('weights')
+    >>>     samples = sml.section('samples')
+    >>>     first = samples[0]
+    """
+
+    def __init__(self, path):
+        """
+
+        Parameters
+        ----------
+        path
+            Path of the SML file.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+        try:
+            self.version, self.sections, self.meta = self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self):
+        """
+        Reads the header and the index, returns the version, the sections and the metadata.
+        """
+        header = self._file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise SMLFormatError(self.path + " is not an SML file")
+        magic, version, flags, offset, length = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SMLFormatError(self.path + " is not an SML file")
+        if version > VERSION:
+            raise SMLFormatError("{} is SML version {}, only up to {} is supported".format(
+                self.path, version, VERSION))
+
+        # A file that was not completely written or copied ends before its index.
+        size = os.fstat(self._file.fileno()).st_size
+        if offset < HEADER.size or offset + length > size:
+            raise SMLFormatError("{} is truncated, its index ends at byte {} of {}".format(
+                self.path, offset + length, size))
+
+        self._file.seek(offset)
+        try:
+            index = json.loads(self._file.read(length).decode('utf-8'))
+            flow = (version, index['sections'], index['meta'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise SMLFormatError("{} has a corrupt index - {}".format(self.path, e))
+        return flow
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def names(self):
+        """
+        Returns the names of the sections, without the sub-sections of sparse sections.
+        """
+        flow = [name for name, section in self.sections.items() if 'parent' not in section]
+        return flow
+
+    def is_sparse(self, name):
+        """
+        Checks if a section is sparse.
+        """
+        flow = self._section(name).get('kind') == 'sparse'
+        return flow
+
+    def close(self):
+        self._file.close()
+
+    def shape(self, name):
+        """
+        Returns the shape of a section.
+        """
+        flow = tuple(self._section(name)['shape'])
+        return flow
+
+    def dtype(self, name):
+        """
+        Returns the data type of a section.
+        """
+        flow = np.dtype(self._section(name)['dtype'])
+        return flow
+
+    def read_chunk(self, name, number):
+        """
+        Reads one chunk of a section.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        number: int
+            Chunk number.
+
+        Returns
+        -------
+        flow  :  narray
+            Rows of the chunk.
+
+        Raises
+        ------
+        SMLFormatError
+            If the chunk cannot be decompressed or does not hold its rows.
+        """
+        section = self._section(name)
+        offset, length, rows = section['chunks'][number]
+
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        try:
+            data = CODECS[section['compression']][1](data)
+            flow = np.frombuffer(data, dtype=section['dtype']).reshape([rows] + section['shape'][1:])
+        except (zlib.error, ValueError) as e:
+            raise SMLFormatError("{} has a corrupt chunk {} in section {} - {}".format(self.path, number, name, e))
+        return flow
+
+    def iter_chunks(self, name):
+        """
+        Yields the chunks of a section in order.
+        """
+        for number in range(len(self._section(name)['chunks'])):
+            yield self.read_chunk(name, number)
+
+    def read(self, name):
+        """
+        Reads a whole section.
+
+        Returns
+        -------
+        flow  :  narray, SparseArray
+        """
+        if self.is_sparse(name):
+            return self.section(name)
+
+        section = self._section(name)
+        flow = np.empty(section['shape'], dtype=section['dtype'])
+
+        start = 0
+        for chunk in self.iter_chunks(name):
+            flow[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return flow
+
+    def section(self, name):
+        """
+        Returns a lazily loaded view of a section.
+
+        An uncompressed section whose chunks follow each other is memory mapped, any other section is returned as a
+        ``Section`` that decompresses the chunks it is indexed with. A sparse section is returned as a
+        ``SparseArray``, its values are memory mapped when possible.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+
+        Returns
+        -------
+        flow  :  numpy.memmap, Section, SparseArray
+        """
+        section = self._section(name)
+        if section.get('kind') == 'sparse':
+            coords = self.section(name + '/coords')
+            values = self.section(name + '/values')
+            return SparseArray(np.asarray(coords).T, np.asarray(values), section['shape'], sort=False)
+
+        chunks = section['chunks']
+        dtype = np.dtype(section['dtype'])
+
+        contiguous = all(a[0] + a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+        if section['compression'] == 'none' and chunks and contiguous and dtype.itemsize:
+            flow = np.memmap(self.path, dtype=dtype, mode='r', offset=chunks[0][0], shape=tuple(section['shape']))
+        else:
+            flow = Section(self, name)
+        return flow
+
+    def _section(self, name):
+        try:
+            return self.sections[name]
+        except KeyError:
+            raise SMLFormatError("{} has no section {}".format(self.path, name))
+
+
+class Section:
+    """
+    Array like view of an SML section, chunks are read and decompressed when they are indexed.
+
+    The first axis can be indexed with an ``int`` or a ``slice`` of any step, any further indices are applied to the
+    rows that were read. The most recently used chunks are kept in memory.
+    """
+    max_chunks = 8
+
+    def __init__(self, reader, name):
+        self.reader = reader
+        self.name = name
+        info = reader.sections[name]
+        self.shape = tuple(info['shape'])
+        self.dtype = np.dtype(info['dtype'])
+        self.ndim = len(self.shape)
+        self._starts = np.cumsum([0] + [chunk[2] for chunk in info['chunks']])
+        self._chunks = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        rest = ()
+        if isinstance(item, tuple):
+            item, rest = item[0], item[1:]
+
+        if isinstance(item, slice):
+            rows = range(*item.indices(self.shape[0]))
+            if not len(rows):
+                flow = np.empty((0,) + self.shape[1:], self.dtype)
+            elif rows.step > 0:
+                flow = self._rows(rows[0], rows[-1] + 1)[::rows.step]
+            else:
+                flow = self._rows(rows[-1], rows[0] + 1)[::-1][::-rows.step]
+            return flow[(slice(None),) + rest] if rest else flow
+
+        index = int(item)
+        if index < 0:
+            index += self.shape[0]
+        if not 0 <= index < self.shape[0]:
+            raise IndexError("Index {} out of range for section {}".format(item, self.name))
+        flow = self._rows(index, index + 1)[0]
+        return flow[rest] if rest else flow
+
+    def __iter__(self):
+        for chunk in self.reader.iter_chunks(self.name):
+            for row in chunk:
+                yield row
+
+    def __array__(self, dtype=None, copy=None):
+        flow = self.reader.read(self.name)
+        return flow if dtype is None else flow.astype(dtype)
+
+    def _rows(self, start, stop):
+        first = int(np.searchsorted(self._starts, start, side='right')) - 1
+        last = int(np.searchsorted(self._starts, stop, side='left'))
+        blocks = [self._chunk(number) for number in range(first, last)]
+        block = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        offset = start - self._starts[first]
+        return block[offset:offset + stop - start]
+
+    def _chunk(self, number):
+        flow = self._chunks.get(number)
+        if flow is not None:
+            self._chunks.move_to_end(number)
+            return flow
+
+        flow = self.reader.read_chunk(self.name, number)
+        self._chunks[number] = flow
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return flow
+
+
+####################################################################
+#                                                                  #
+#                           Exceptions                             #
+#                                                                  #
+####################################################################
+
+
+class SMLFormatError(Exception):
+    def __init__(self, message, errors=None):
+        super(SMLFormatError, self).__init__(message)
+
+        self.errors = errors
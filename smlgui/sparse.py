@@ -0,0 +1,210 @@
+"""
+Sparse arrays for spike trains and network connections, which are mostly zeros.
+"""
+import numpy as np
+
+from smlgui.parsing import sniff_format
+
+__all__ = ['SparseArray', 'read_edge_list']
+
+
+class SparseArray:
+    """
+    N-dimensional array in coordinate (COO) format.
+
+    Only the non-zero values are stored, with their coordinates. The entries are kept in row-major order, so the
+    entries of a row along the first axis are next to each other and can be found with a binary search.
+
+    >>> spikes = SparseArray.from_events([3, 7], [10, 42], shape=(128, 1000))  # Neuron 3 at t=10, 7 at t=42
+    >>> spikes.nnz
+    2
+    """
+
+    def __init__(self, coords, values, shape, sort=True):
+        """
+
+        Parameters
+        ----------
+        coords
+            Coordinates of the values as an ``(ndim, nnz)`` integer array.
+        values
+            Values as a 1D array of length ``nnz``.
+        shape: tuple
+            Shape of the dense array.
+        sort: bool
+            Sort the entries in row-major order, can be skipped if they already are.
+        """
+        self.coords = np.asarray(coords, dtype=np.int64).reshape(len(shape), -1)
+        self.values = np.asarray(values).reshape(-1)
+        self.shape = tuple(int(length) for length in shape)
+
+        if self.coords.shape[1] != len(self.values):
+            raise ValueError("Got {} coordinates for {} values".format(self.coords.shape[1], len(self.values)))
+
+        if sort and self.nnz:
+            order = np.ravel_multi_index(self.coords, self.shape).argsort(kind='stable')
+            self.coords = self.coords[:, order]
+            self.values = self.values[order]
+
+    @classmethod
+    def from_dense(cls, array):
+        """
+        Builds a ``SparseArray`` from the non-zero values of a dense array.
+        """
+        array = np.asarray(array)
+        coords = np.array(np.nonzero(array), dtype=np.int64).reshape(array.ndim, -1)
+        flow = cls(coords, array[tuple(coords)], array.shape, sort=False)
+        return flow
+
+    @classmethod
+    def from_events(cls, neurons, times, shape, values=None):
+        """
+        Builds a 2D ``(neurons, time)`` spike train from a list of spike events.
+
+        Parameters
+        ----------
+        neurons
+            Neuron of every event.
+        times
+            Time of every event.
+        shape: tuple
+            Number of neurons and time steps.
+        values
+            Value of every event, defaults to ``1``.
+        """
+        if values is None:
+            values = np.ones(len(neurons), dtype=np.int8)
+        flow = cls(np.vstack([neurons, times]), values, shape)
+        return flow
+
+    @classmethod
+    def from_edges(cls, pre, post, values=None, shape=None):
+        """
+        Builds a 2D ``(pre, post)`` connection matrix from a list of edges, without a dense matrix in between.
+
+        Parameters
+        ----------
+        pre
+            Presynaptic neuron of every edge.
+        post
+            Postsynaptic neuron of every edge.
+        values
+            Weight of every edge, defaults to ``1``.
+        shape: tuple
+            Number of pre and postsynaptic neurons, defaults to a square matrix that fits every neuron.
+        """
+        pre, post = np.asarray(pre, dtype=np.int64), np.asarray(post, dtype=np.int64)
+        if values is None:
+            values = np.ones(len(pre), dtype=np.int8)
+        if shape is None:
+            size = int(max(pre.max(), post.max())) + 1 if len(pre) else 0
+            shape = (size, size)
+        flow = cls(np.vstack([pre, post]), values, shape)
+        return flow
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    @property
+    def density(self):
+        size = int(np.prod(self.shape, dtype=np.int64))
+        return self.nnz / size if size else 0.0
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        """
+        Indexes the first axis with an ``int`` or a contiguous ``slice``, the result is a ``SparseArray``.
+        """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.shape[0])
+            if step != 1:
+                raise IndexError("SparseArray only supports slices with a step of 1")
+            stop = max(start, stop)
+            first, last = np.searchsorted(self.coords[0], [start, stop])
+            coords = self.coords[:, first:last].copy()
+            coords[0] -= start
+            return SparseArray(coords, self.values[first:last], (stop - start,) + self.shape[1:], sort=False)
+
+        index = int(item)
+        if index < 0:
+            index += self.shape[0]
+        if not 0 <= index < self.shape[0]:
+            raise IndexError("Index {} out of range for shape {}".format(item, self.shape))
+
+        first, last = np.searchsorted(self.coords[0], [index, index + 1])
+        if self.ndim == 1:
+            return self.values[first] if last > first else self.dtype.type(0)
+        return SparseArray(self.coords[1:, first:last], self.values[first:last], self.shape[1:], sort=False)
+
+    def __array__(self, dtype=None, copy=None):
+        flow = self.to_dense()
+        return flow if dtype is None else flow.astype(dtype)
+
+    def to_dense(self):
+        """
+        Returns the dense array.
+        """
+        flow = np.zeros(self.shape, dtype=self.dtype)
+        flow[tuple(self.coords)] = self.values
+        return flow
+
+    def events(self):
+        """
+        Returns the entries as an ``(nnz, ndim + 1)`` table of coordinates followed by the value.
+        """
+        flow = np.column_stack([self.coords.T, self.values])
+        return flow
+
+
+def read_edge_list(path, shape=None, delimiter=None):
+    """
+    Reads a connection matrix from a text file of edges, one ``pre, post[, weight]`` row per edge. The columns may be
+    separated by commas, semicolons, tabs or spaces and the file may start with a header row.
+
+    Parameters
+    ----------
+    path: str
+        Path of the edge list.
+    shape: tuple
+        Shape of the matrix, see ``SparseArray.from_edges``.
+    delimiter: str
+        Column delimiter, sniffed from the start of the file if ``None``.
+
+    Returns
+    -------
+    flow  :  SparseArray
+        Without a weight column every edge is ``1``.
+
+    Raises
+    ------
+    ValueError
+        If the file is not an edge list.
+    """
+    header = 0
+    if delimiter is None:
+        with open(path, 'rb') as f:
+            fmt = sniff_format(f.read(65536))
+        delimiter, header = fmt.delimiter, fmt.header
+
+    edges = np.loadtxt(path, delimiter=delimiter, skiprows=header, ndmin=2)
+    if edges.size and edges.shape[1] not in (2, 3):
+        raise ValueError("Expected 2 or 3 columns, pre, post and an optional weight, got {}".format(edges.shape[1]))
+
+    neurons = edges[:, :2]
+    if neurons.size and (np.any(neurons < 0) or np.any(neurons != np.floor(neurons))):
+        raise ValueError("Neurons should be numbered with non-negative integers")
+
+    values = edges[:, 2] if edges.shape[1] == 3 else None
+    flow = SparseArray.from_edges(neurons[:, 0], neurons[:, 1], values, shape)
+    return flow
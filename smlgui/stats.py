@@ -0,0 +1,174 @@
+"""
+Summary statistics of a sample tensor.
+
+Nothing in here imports PyQt5, the statistics are shown by ``widgets.StatsWidget``.
+"""
+from collections import Counter
+
+import numpy as np
+
+from smlgui.dtypes import dequantize
+from smlgui.profiling import span
+
+__all__ = ['SampleStats']
+
+
+class SampleStats:
+    """
+    Per-sample and per-feature mean, standard deviation, minimum, maximum and number of ``nan`` values of a
+    ``(samples, time, features)`` tensor, along with the number of samples of every class.
+
+    Samples are added a batch at a time with ``update``, each batch is reduced in one vectorised pass and merged into
+    the per-feature statistics with Chan's parallel algorithm, so adding samples does not revisit the earlier ones.
+    ``nan`` values are left out of every statistic, standard deviations are population standard deviations.
+
+    >>> stats = SampleStats.from_samples(read_csv.read_samples(), read_csv._get_class_labels())
+    >>> stats.feature_mean
+    array([...])
+    """
+
+    def __init__(self, time_length, features):
+        """
+
+        Parameters
+        ----------
+        time_length: int
+            Time length of a sample.
+        features: int
+            Number of features of a sample.
+        """
+        self.time_length = time_length
+        self.features = features
+
+        self.sample_mean = np.empty(0)
+        self.sample_std = np.empty(0)
+        self.sample_min = np.empty(0)
+        self.sample_max = np.empty(0)
+        self.sample_nan = np.empty(0, dtype=np.int64)
+
+        self.feature_count = np.zeros(features, dtype=np.int64)
+        self.feature_mean = np.zeros(features)
+        self.feature_min = np.full(features, np.nan)
+        self.feature_max = np.full(features, np.nan)
+        self.feature_nan = np.zeros(features, dtype=np.int64)
+        self._feature_m2 = np.zeros(features)
+
+        self.class_counts = Counter()
+
+    @classmethod
+    def from_samples(cls, data, labels=None, batch_size=256, scale=None):
+        """
+        Computes the statistics of a sample tensor, ``batch_size`` samples at a time so that a memory map is not
+        read into memory all at once.
+
+        Parameters
+        ----------
+        data
+            ``(samples, time, features)`` tensor, can be a ``numpy.memmap`` or an SML ``Section``.
+        labels: list
+            Class label of every sample.
+        batch_size: int
+            Number of samples reduced at a time.
+        scale: float
+            Scale of ``int16`` samples, see ``dtypes``.
+        """
+        flow = cls(data.shape[1], data.shape[2])
+        with span('stats', samples=data.shape[0]):
+            for start in range(0, data.shape[0], batch_size):
+                flow.update(data[start:start + batch_size],
+                            labels[start:start + batch_size] if labels is not None else None, scale)
+        return flow
+
+    @property
+    def n_samples(self):
+        return len(self.sample_mean)
+
+    @property
+    def feature_std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            flow = np.sqrt(self._feature_m2 / self.feature_count)
+        return flow
+
+    def update(self, batch, labels=None, scale=None):
+        """
+        Adds a batch of samples.
+
+        Parameters
+        ----------
+        batch
+            ``(samples, time, features)`` array.
+        labels: list
+            Class label of every sample in ``batch``.
+        scale: float
+            Scale of ``int16`` samples.
+        """
+        batch = np.asarray(dequantize(batch, scale, np.float64), dtype=np.float64)
+        if batch.shape[1:] != (self.time_length, self.features):
+            raise ValueError("Expected samples of shape {}, got {}".format((self.time_length, self.features),
+                                                                           batch.shape[1:]))
+        if labels is not None and len(labels) != len(batch):
+            raise ValueError("Got {} class labels for {} samples".format(len(labels), len(batch)))
+
+        missing = np.isnan(batch)
+        present = ~missing
+        values = np.where(missing, 0.0, batch)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Per sample, over time and features.
+            count = present.sum(axis=(1, 2))
+            mean = values.sum(axis=(1, 2)) / count
+            deviation = np.where(missing, 0.0, batch - mean[:, None, None])
+            std = np.sqrt(np.square(deviation).sum(axis=(1, 2)) / count)
+
+            # Per feature, over samples and time.
+            batch_count = present.sum(axis=(0, 1))
+            batch_mean = values.sum(axis=(0, 1)) / batch_count
+            deviation = np.where(missing, 0.0, batch - batch_mean)
+            batch_m2 = np.square(deviation).sum(axis=(0, 1))
+
+        if batch.size:
+            minimum, maximum = np.fmin.reduce(batch, axis=(1, 2)), np.fmax.reduce(batch, axis=(1, 2))
+            self.feature_min = np.fmin(self.feature_min, np.fmin.reduce(batch, axis=(0, 1)))
+            self.feature_max = np.fmax(self.feature_max, np.fmax.reduce(batch, axis=(0, 1)))
+        else:
+            minimum = maximum = np.full(len(batch), np.nan)
+
+        self.sample_mean = np.concatenate([self.sample_mean, mean])
+        self.sample_std = np.concatenate([self.sample_std, std])
+        self.sample_min = np.concatenate([self.sample_min, minimum])
+        self.sample_max = np.concatenate([self.sample_max, maximum])
+        self.sample_nan = np.concatenate([self.sample_nan, missing.sum(axis=(1, 2))])
+
+        self._merge(batch_count, np.nan_to_num(batch_mean), batch_m2)
+        self.feature_nan += missing.sum(axis=(0, 1))
+
+        if labels is not None:
+            self.class_counts.update(np.asarray(labels).tolist())
+
+    def _merge(self, count, mean, m2):
+        """
+        Merges the count, mean and sum of squared deviations of a batch into the per-feature statistics.
+        """
+        total = self.feature_count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.feature_mean
+            self.feature_mean = np.where(total > 0, self.feature_mean + delta * count / total, 0.0)
+            self._feature_m2 = np.where(total > 0, self._feature_m2 + m2 + delta ** 2 * self.feature_count * count /
+                                        total, 0.0)
+        self.feature_count = total
+
+    def sample_table(self):
+        """
+        Returns the per-sample statistics as a ``(samples, 5)`` table of mean, standard deviation, minimum, maximum
+        and number of ``nan`` values.
+        """
+        flow = np.column_stack([self.sample_mean, self.sample_std, self.sample_min, self.sample_max, self.sample_nan])
+        return flow
+
+    def feature_table(self):
+        """
+        Returns the per-feature statistics as a ``(features, 5)`` table like ``sample_table``.
+        """
+        flow = np.column_stack([np.where(self.feature_count > 0, self.feature_mean, np.nan), self.feature_std,
+                                self.feature_min, self.feature_max, self.feature_nan])
+        return flow
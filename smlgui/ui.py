@@ -8,9 +8,14 @@ import numpy as np
 from PyQt5 import uic, QtWidgets, QtGui, QtCore
 
 from smlgui import __version__
+from smlgui.dtypes import DTYPES
+from smlgui.parsing import format_issues
 from smlgui.utility import select_folder, loading_effects_decorator, get_sml_conf, write_sml_config, \
-    loading_effects_context, ReadCSV
-from smlgui.widgets import TabWidget, CustomQMainWidget, CustomQDialog
+    loading_effects_context, ReadCSV, NotEnoughDataError
+from smlgui.sml import SMLReader, SMLFormatError, SECTIONS
+from smlgui.sparse import SparseArray, read_edge_list
+from smlgui.widgets import TabWidget, SectionTabWidget, StatsWidget, CustomQMainWidget, CustomQDialog
+from smlgui.workers import SampleLoader, SMLExporter, CSVExporter, StatsWorker, FolderWatcher, start_worker
 
 __all__ = ['AboutUi', 'HomeUi', 'PreferenceUi', 'ImportUi', 'ExportUi']
 
@@ -142,20 +147,179 @@ class ImportUi(CustomQMainWidget):
         self.spikes_to_csv.setEnabled(False)
         self.encoded_to_csv.setEnabled(False)
 
+        self.sml = None
+        self.stats_worker = None
+
+        # Exporting progress
+        self.worker = None
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.hide()
+        self.messageBar.addPermanentWidget(self.progress_bar)
+        self.messageBar.addPermanentWidget(self.cancel_button)
+
         # GUI
         self.load_sml_button.clicked.connect(self.load_table)
         self.about_menu.triggered.connect(self.show_about)
+        self.cancel_button.clicked.connect(self.cancel_worker)
+        for name in SECTIONS:
+            getattr(self, name + '_to_csv').clicked.connect(lambda checked, name=name: self.save_csv(name))
 
         logger.info("Exporter GUI started")
 
     @loading_effects_decorator
     def load_table(self):
         """
-        Populates the ``samples`` table.
+        Opens an SML file and populates the ``samples`` table. Only the file's index is read, each section is read
+        when its tab is opened.
         """
-        self.temp_text_table.deleteLater()
-        table_widget = TabWidget(np.random.randn(60, 128, 14))
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open SML", "", "SML (*.sml);;All files (*)")
+        if not path:
+            return
+
+        try:
+            sml = SMLReader(path)
+        except (IOError, SMLFormatError) as e:
+            QtWidgets.QMessageBox.warning(self, "SML Importer", "Unable to open {}: {}".format(path, e))
+            return
+
+        try:
+            self.temp_text_table.deleteLater()
+        except Exception:
+            pass
+
+        # Remove if SectionTabWidget already exists.
+        for a in range(self.table_layout.count()):
+            if isinstance(self.table_layout.itemAt(a).widget(), SectionTabWidget):
+                self.table_layout.itemAt(a).widget().deleteLater()
+        if self.sml is not None:
+            self.sml.close()
+
+        self.sml = sml
+        table_widget = SectionTabWidget(sml)
         self.table_layout.addWidget(table_widget)
+        self._enable_exports()
+        self.messageBar.showMessage("Opened " + path)
+
+        if self.stats_worker is not None:
+            self.stats_worker.cancel()
+            self.stats_worker = None
+        if 'samples' in sml and len(sml.shape('samples')) == 3 and not sml.is_sparse('samples'):
+            self.stats_worker = StatsWorker(path)
+            self.stats_worker.finished.connect(self.on_stats_finished)
+            self.stats_worker.failed.connect(self.on_stats_failed)
+            start_worker(self.stats_worker, self)
+
+    def on_stats_finished(self, stats):
+        """
+        Replaces the statistics panel with the statistics of the ``samples`` section.
+        """
+        if self.sender() is not self.stats_worker:
+            return  # A file that has since been replaced.
+        self.stats_worker = None
+
+        try:
+            self.temp_text_stats.deleteLater()
+        except Exception:
+            pass
+
+        # Remove if StatsWidget already exists.
+        for a in range(self.stats_layout.count()):
+            if isinstance(self.stats_layout.itemAt(a).widget(), StatsWidget):
+                self.stats_layout.itemAt(a).widget().deleteLater()
+
+        self.stats_layout.addWidget(StatsWidget(stats, self.sml.meta.get('feature_names')))
+
+    def on_stats_failed(self, message):
+        """
+        Reports statistics that could not be computed.
+        """
+        if self.sender() is self.stats_worker:
+            self.stats_worker = None
+            self.messageBar.showMessage("Unable to compute statistics: " + message)
+
+    def save_csv(self, name):
+        """
+        Event for the ``* to CSV`` buttons, writes section ``name`` to CSV in a ``CSVExporter`` thread.
+
+        Parameters
+        ----------
+        name: str
+            Name of the section.
+        """
+        if self.sml is None or name not in self.sml:
+            return
+
+        shape = self.sml.shape(name)
+        if len(shape) == 3 and not self.sml.is_sparse(name):
+            output = QtWidgets.QFileDialog.getExistingDirectory(self, "Export {} to folder".format(name))
+        else:
+            output, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export " + name, name + ".csv", "CSV (*.csv)")
+        if not output:
+            return
+
+        self.worker = CSVExporter(self.sml.path, name, output)
+        self.worker.progress.connect(self.on_export_progress)
+        self.worker.finished.connect(self.on_export_finished)
+        self.worker.failed.connect(self.on_export_failed)
+        self.worker.cancelled.connect(self.on_export_cancelled)
+
+        self.load_sml_button.setEnabled(False)
+        for button in SECTIONS:
+            getattr(self, button + '_to_csv').setEnabled(False)
+        self.progress_bar.setRange(0, self.sml.sections[name]['nnz'] if self.sml.is_sparse(name) else shape[0])
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        self.messageBar.showMessage("Exporting {} to {}".format(name, output))
+        start_worker(self.worker, self)
+
+    def cancel_worker(self):
+        """
+        Event for the ``Cancel`` button.
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def on_export_progress(self, written, total, eta):
+        """
+        Shows the progress of ``CSVExporter``.
+        """
+        self.progress_bar.setValue(written)
+        self.messageBar.showMessage("Exported {} of {} rows, about {:.0f} s left".format(written, total, eta))
+
+    def on_export_finished(self, output):
+        """
+        Reports a finished export.
+        """
+        self._end_worker("Exported to " + output)
+
+    def on_export_failed(self, message):
+        """
+        Reports a failed export.
+        """
+        self._end_worker(self.status_message)
+        QtWidgets.QMessageBox.warning(self, "SML Importer", "Unable to export: " + message)
+
+    def on_export_cancelled(self):
+        """
+        Reports a cancelled export.
+        """
+        self._end_worker("Export cancelled.")
+
+    def _end_worker(self, message):
+        self.worker = None
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        self.load_sml_button.setEnabled(True)
+        self._enable_exports()
+        self.messageBar.showMessage(message)
+
+    def _enable_exports(self):
+        for name in SECTIONS:
+            getattr(self, name + '_to_csv').setEnabled(self.sml is not None and name in self.sml)
 
     @staticmethod
     def show_about():
@@ -167,6 +331,11 @@ class ImportUi(CustomQMainWidget):
 
     def closeEvent(self, a0: QtGui.QCloseEvent):
         logger.info("Exiting ImportUi")
+        self.cancel_worker()
+        if self.stats_worker is not None:
+            self.stats_worker.cancel()
+        if self.sml is not None:
+            self.sml.close()
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
 
 
@@ -174,6 +343,8 @@ class ExportUi(CustomQMainWidget):
     """
     Main class that loads and runs the ``export.ui``.
     """
+    matrix_filter = "CSV matrix (*.csv)"
+    edges_filter = "Edge list, pre,post[,weight] (*.csv *.txt *.edges)"
 
     def __init__(self, parent=None):
         super(ExportUi, self).__init__(parent)
@@ -205,9 +376,44 @@ class ExportUi(CustomQMainWidget):
         self.temp_text_stats.setMinimumHeight(150)
         self.temp_text_stats.setMinimumWidth(500)
 
+        # Loading and exporting progress
+        self.worker = None
+        self.read_csv = None
+        self.feature_names = None
+        self.network = None
+        self.weights = None
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.hide()
+        self.messageBar.addPermanentWidget(self.progress_bar)
+        self.messageBar.addPermanentWidget(self.cancel_button)
+
+        # Reloads new and changed samples while the folder is being written to
+        self.watcher = None
+        self._refresh_pending = False
+        self.watch_check = QtWidgets.QCheckBox("Watch folder")
+        self.watch_check.setToolTip("Reload new and changed samples automatically")
+        self.watch_check.setEnabled(False)
+        self.messageBar.addPermanentWidget(self.watch_check)
+
+        # Type the samples are held in, smaller types fit more samples in memory
+        self.dtype_combo = QtWidgets.QComboBox()
+        self.dtype_combo.addItems(DTYPES)
+        self.dtype_combo.setToolTip("Type the samples are loaded and exported as, int16 samples are scaled")
+        self.messageBar.addPermanentWidget(self.dtype_combo)
+
         # Connections and events
         self.load_samples_button.clicked.connect(self.load_table)
         self.load_samples_button.installEventFilter(self)
+        self.cancel_button.clicked.connect(self.cancel_worker)
+        self.load_feature_names.clicked.connect(self.open_feature_names)
+        self.load_network.clicked.connect(self.open_network)
+        self.load_weights.clicked.connect(self.open_weights)
+        self.export_sml.clicked.connect(self.save_sml)
+        self.export_sml.setEnabled(False)
+        self.watch_check.toggled.connect(self._update_watcher)
 
         self.stats_layout.addWidget(self.temp_text_stats)
         self.table_layout.addWidget(self.temp_text_table)
@@ -217,24 +423,271 @@ class ExportUi(CustomQMainWidget):
 
     def load_table(self):
         """
-        Populates the ``samples`` table.
+        Reads the samples of a folder in a ``SampleLoader`` thread, the ``samples`` table is populated when it is done.
         """
         location = select_folder()
-        read_csv = ReadCSV(location)
+        if not location:
+            return
+
+        try:
+            read_csv = ReadCSV(location, dtype=self.dtype_combo.currentText())
+        except (IOError, NotEnoughDataError) as e:
+            QtWidgets.QMessageBox.warning(self, "SML Exporter", str(e))
+            return
+
+        self._start_worker(SampleLoader(read_csv), read_csv.sample_size(), "Loading samples from " + location)
+        self.worker.progress.connect(self.on_load_progress)
+        self.worker.finished.connect(self.on_load_finished)
+        self.worker.failed.connect(self.on_load_failed)
+        self.worker.cancelled.connect(self.on_load_cancelled)
+        start_worker(self.worker, self)
+
+    def refresh_table(self):
+        """
+        Reads only the new and changed samples of the loaded folder in a ``SampleLoader`` thread, called by the
+        folder watcher. If another job is running the refresh waits for it to end.
+        """
+        if self.read_csv is None:
+            return
+        if self.worker is not None:
+            self._refresh_pending = True
+            return
+
+        self._refresh_pending = False
+        self._start_worker(SampleLoader(self.read_csv, refresh=True), 0, "Refreshing samples")
+        self.worker.progress.connect(self.on_load_progress)
+        self.worker.finished.connect(self.on_load_finished)
+        self.worker.failed.connect(self.on_load_failed)
+        self.worker.cancelled.connect(self.on_load_cancelled)
+        start_worker(self.worker, self)
+
+    def _update_watcher(self):
+        """
+        Watches the loaded folder while ``Watch folder`` is checked.
+        """
+        folder = self.read_csv.data_folder if self.read_csv is not None else None
+        if self.watcher is not None and (not self.watch_check.isChecked() or self.watcher.folder != folder):
+            self.watcher.stop()
+            self.watcher.deleteLater()
+            self.watcher = None
+
+        if self.watcher is None and self.watch_check.isChecked() and folder is not None:
+            self.watcher = FolderWatcher(folder, scan=self._folder_changed, parent=self)
+            self.watcher.changed.connect(self.refresh_table)
+
+    def _folder_changed(self):
+        """
+        Polled by the folder watcher, returns ``True`` if sample files changed since the samples were loaded. Nothing
+        is scanned while a job is running, the loader may be updating the samples.
+        """
+        if self.read_csv is None or self.worker is not None:
+            return False
+        flow = any(self.read_csv.scan().values())
+        return flow
 
+    def open_feature_names(self):
+        """
+        Event for the ``Load Feature Names`` button, one name per line.
+        """
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Feature names", "", "Text (*.txt);;All files (*)")
+        if path:
+            with open(path, 'r') as f:
+                self.feature_names = [name.strip() for name in f.read().splitlines() if name.strip()]
+            self.messageBar.showMessage("Loaded {} feature names".format(len(self.feature_names)))
+
+    def open_network(self):
+        """
+        Event for the ``Load Network`` button, the connections of the network as a CSV matrix or an edge list.
+        Connections are mostly zeros, so they are kept as a ``SparseArray``.
+        """
+        network = self._open_array("Network")
+        self.network = SparseArray.from_dense(network) if isinstance(network, np.ndarray) else network
+
+    def open_weights(self):
+        """
+        Event for the ``Load Weights`` button, the weights of the network as a CSV matrix or an edge list.
+        """
+        self.weights = self._open_array("Weights")
+
+    def _open_array(self, title):
+        """
+        Reads a CSV matrix as an array, or an edge list of ``pre, post[, weight]`` rows straight into a
+        ``SparseArray`` so that the dense matrix of a large network is never built.
+        """
+        path, selected = QtWidgets.QFileDialog.getOpenFileName(
+            self, title, "", ";;".join([self.matrix_filter, self.edges_filter, "All files (*)"]))
+        if not path:
+            return None
+
+        try:
+            if selected == self.edges_filter:
+                flow = read_edge_list(path)
+            else:
+                flow = np.loadtxt(path, delimiter=',', ndmin=2)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "SML Exporter", "Unable to read {}: {}".format(path, e))
+            return None
+
+        if isinstance(flow, SparseArray):
+            self.messageBar.showMessage("Loaded {} of shape {} with {} edges".format(
+                title.lower(), flow.shape, flow.nnz))
+        else:
+            self.messageBar.showMessage("Loaded {} of shape {}".format(title.lower(), flow.shape))
+        return flow
+
+    def save_sml(self):
+        """
+        Event for the ``Export SML`` button, streams the samples and everything loaded so far to an SML file in a
+        ``SMLExporter`` thread.
+        """
+        if self.read_csv is None:
+            return
+
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export SML", "", "SML (*.sml)")
+        if not path:
+            return
+
+        settings = {'neuron_type': self.neuron_type.currentText(),
+                    'learning_type': self.learning_type.currentText(),
+                    'learning_way': self.learning_way.currentText()}
+
+        self._start_worker(SMLExporter(self.read_csv, path, feature_names=self.feature_names, network=self.network,
+                                       weights=self.weights, settings=settings),
+                           self.read_csv.sample_size(), "Exporting to " + path)
+        self.worker.progress.connect(self.on_export_progress)
+        self.worker.finished.connect(self.on_export_finished)
+        self.worker.failed.connect(self.on_export_failed)
+        self.worker.cancelled.connect(self.on_export_cancelled)
+        start_worker(self.worker, self)
+
+    def on_export_progress(self, written, total, eta):
+        """
+        Shows the progress of ``SMLExporter``.
+        """
+        self.progress_bar.setValue(written)
+        self.messageBar.showMessage("Exported {} of {} samples, about {:.0f} s left".format(written, total, eta))
+
+    def on_export_finished(self, path):
+        """
+        Reports a finished export.
+        """
+        self._end_worker("Exported to " + path)
+
+    def on_export_failed(self, message):
+        """
+        Reports a failed export.
+        """
+        self._end_worker(self.status_message)
+        QtWidgets.QMessageBox.warning(self, "SML Exporter", "Unable to export: " + message)
+
+    def on_export_cancelled(self):
+        """
+        Reports a cancelled export.
+        """
+        self._end_worker("Export cancelled.")
+
+    def cancel_worker(self):
+        """
+        Event for the ``Cancel`` button.
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def on_load_progress(self, files, total, nbytes, total_bytes, eta):
+        """
+        Shows the progress of ``SampleLoader``.
+        """
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(files)
+        self.messageBar.showMessage("Parsed {} of {} files, {:.1f} of {:.1f} MB, about {:.0f} s left".format(
+            files, total, nbytes / 1e6, total_bytes / 1e6, eta))
+
+    def on_load_finished(self, samples):
+        """
+        Replaces the ``samples`` table with the loaded samples.
+        """
         with loading_effects_context():
             try:
                 self.temp_text_table.deleteLater()
             except Exception:
                 pass
 
-            # Remove if QTabWidget already exists.
+            # Remove if TabWidget already exists, a refresh keeps showing the same sample.
+            selected = 0
             for a in range(self.table_layout.count()):
-                if isinstance(self.table_layout.itemAt(a).widget(), QtWidgets.QTabWidget):
+                if isinstance(self.table_layout.itemAt(a).widget(), TabWidget):
+                    if self.worker.refresh:
+                        selected = self.table_layout.itemAt(a).widget().sample_selector.value()
                     self.table_layout.itemAt(a).widget().deleteLater()
 
-            table_widget = TabWidget(read_csv.read_samples())
+            table_widget = TabWidget(samples, scale=self.worker.read_csv.scale)
             self.table_layout.addWidget(table_widget)
+            if selected:
+                table_widget.sample_selector.setValue(min(selected, len(samples) - 1))
+
+            try:
+                self.temp_text_stats.deleteLater()
+            except Exception:
+                pass
+
+            # Remove if StatsWidget already exists, the loader has already brought the statistics up to date.
+            for a in range(self.stats_layout.count()):
+                if isinstance(self.stats_layout.itemAt(a).widget(), StatsWidget):
+                    self.stats_layout.itemAt(a).widget().deleteLater()
+
+            read_csv = self.worker.read_csv
+            self.stats_layout.addWidget(StatsWidget(read_csv.stats(), read_csv.get_feature_names()['name_features']))
+
+        self.read_csv = self.worker.read_csv
+        self.export_sml.setEnabled(True)
+        self.watch_check.setEnabled(True)
+        self._update_watcher()
+
+        # A refresh only reports problems in the message bar, so a folder being written to does not keep popping up
+        # dialogs.
+        issues, refresh = self.read_csv.issues, self.worker.refresh
+        if issues and refresh:
+            self._end_worker("{} problems in new sample files, see the log".format(len(issues)))
+        else:
+            self._end_worker(self.status_message)
+        if issues and not refresh:
+            QtWidgets.QMessageBox.warning(self, "SML Exporter", "{} problems found in the samples, {} files skipped:\n"
+                                          "{}".format(len(issues), len(self.read_csv.skipped),
+                                                      format_issues(issues, limit=10)))
+
+    def on_load_failed(self, message):
+        """
+        Reports a failed load.
+        """
+        self._end_worker(self.status_message)
+        QtWidgets.QMessageBox.warning(self, "SML Exporter", "Unable to load samples: " + message)
+
+    def on_load_cancelled(self):
+        """
+        Reports a cancelled load.
+        """
+        self._end_worker("Loading cancelled.")
+
+    def _start_worker(self, worker, total, message):
+        self.worker = worker
+        self.load_samples_button.setEnabled(False)
+        self.export_sml.setEnabled(False)
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        self.messageBar.showMessage(message)
+
+    def _end_worker(self, message):
+        self.worker = None
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        self.load_samples_button.setEnabled(True)
+        self.export_sml.setEnabled(self.read_csv is not None)
+        self.messageBar.showMessage(message)
+
+        if self._refresh_pending:
+            self.refresh_table()
 
     @staticmethod
     def show_about():
@@ -257,6 +710,8 @@ class ExportUi(CustomQMainWidget):
 
     def closeEvent(self, a0: QtGui.QCloseEvent):
         logger.info("Exiting ExportUi")
+        self.cancel_worker()
+        self.watch_check.setChecked(False)
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
 
 
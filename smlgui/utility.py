@@ -9,24 +9,34 @@ except ImportError:
     import ConfigParser as configparser
     pass
 
-import csv
 import logging
 import os
 import platform
 import re
 import sys
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
+from functools import partial
 
 import numpy as np
-from PyQt5 import QtWidgets, QtCore, QtGui
-from sklearn.model_selection import train_test_split
 
+from smlgui.cache import SampleCache
+from smlgui.dtypes import resolve_dtype, auto_scale, dequantize
+from smlgui.parsing import DEFAULT_FORMAT, POLICIES, sniff_format, parse_sample, format_issues
 from smlgui.processor import check_files
+from smlgui.profiling import span, count
+from smlgui.stats import SampleStats
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['ReadCSV', 'is_windows', 'is_linux', 'is_mac', 'is_python3', 'select_folder', 'load_stylesheet',
-           'loading_effects_context', 'loading_effects_decorator', 'get_sml_conf', 'write_sml_config']
+__all__ = ['ReadCSV', 'SampleSubset', 'train_test_indices', 'k_fold_indices', 'is_windows', 'is_linux', 'is_mac',
+           'is_python3', 'select_folder', 'load_stylesheet', 'loading_effects_context', 'loading_effects_decorator',
+           'get_sml_conf', 'write_sml_config']
+
+# Number of sample files the shape of a folder is taken from.
+SHAPE_SAMPLES = 5
 
 
 class ReadCSV:
@@ -35,13 +45,33 @@ class ReadCSV:
     This class reads in the CSV files starting with sam_*.csv, where * is the number.
     """
 
-    def __init__(self, data):
+    def __init__(self, data, workers=None, processes=False, dtype=np.float64, cache=True, cache_dir=None,
+                 scale=None, on_error='pad'):
         """
 
         Parameters
         ----------
         data
             Location of samples (folder location).
+        workers
+            Number of workers used to parse the samples. Defaults to the number of CPUs, ``1`` parses the files
+            serially.
+        processes
+            Parse the samples in a process pool instead of a thread pool.
+        dtype
+            Data type of the sample tensor, one of ``float64``, ``float32``, ``float16`` or ``int16``. ``float32``
+            and ``float16`` hold two and four times as many samples in the same memory as ``float64``. ``int16``
+            samples are scaled by ``scale``, see ``sample_scale``. A file with values out of range is handled by the
+            ``on_error`` policy, ``pad`` clips them.
+        cache
+            Keep the parsed samples in a memory mapped ``.npy`` cache, which is reused until a sample file changes.
+        cache_dir
+            Folder to keep the cache in, defaults to ``.sml_cache`` inside ``data``.
+        scale
+            Value of one step of ``int16`` samples, taken from the first sample if not given.
+        on_error
+            What to do with a malformed sample file, ``pad`` it with ``nan``, ``skip`` it or ``fail``, see
+            ``parsing``. The problems found are kept in ``issues``, skipped files in ``skipped``.
 
         Note
         -----
@@ -51,17 +81,52 @@ class ReadCSV:
 
         self.data_folder = data + os.sep
         if os.path.isdir(self.data_folder):
-            self.prefixed = [filename for filename in os.listdir(self.data_folder) if filename.startswith("sam")]
+            self.prefixed, self._listing, self._others = self._scan_folder()
         else:
             raise IOError('Data files not found')
 
+        self.workers = workers
+        self.processes = processes
+        self.dtype = resolve_dtype(dtype)
+        self.scale = scale if self.dtype == np.int16 else None
+        if on_error not in POLICIES:
+            raise ValueError("Unknown policy {}, expected one of {}".format(on_error, ', '.join(POLICIES)))
+        self.on_error = on_error
+        self.cache = SampleCache(self.data_folder, cache_dir) if cache else None
+
+        # Size and modification time of every file in the last loaded tensor, used by ``refresh``.
+        self._files = {}
+        self._samples = None
+        # Problems found by the last parse, and the files left out by the ``skip`` policy with their size and
+        # modification time, they are parsed again once they change.
+        self.issues = []
+        self.skipped = {}
+        self._metadata = None
+        self._stats = None
+
         if len(self.prefixed) is 1:
             raise NotEnoughDataError("There should be more than one sample to continue.")
 
-    def read_samples(self):
+    @span('read_samples')
+    def read_samples(self, workers=None, progress=None):
         """Read samples
 
-        This method reads the files and indexes according to their sam_* number.
+        This method reads the files and indexes according to their sam_* number. Files are parsed by NumPy's C
+        parser, spread across a pool of ``workers``, straight into a preallocated ``(samples, time, features)``
+        array whose shape and format are taken from ``metadata``. When caching is enabled that array is a memory
+        mapped ``.npy`` file, later calls return it read only without parsing the files again.
+
+        Malformed files are handled by the ``on_error`` policy given to the constructor, see ``parsing``. The
+        problems found are logged and kept in ``issues``, skipped files are left out of the samples and the class
+        labels until they change.
+
+        Parameters
+        ----------
+        workers
+            Overrides the number of workers given to the constructor.
+        progress
+            Optional callable, called as ``progress(files_parsed, total_files, bytes_parsed)`` after every file.
+            Returning ``False`` cancels the load. It may be called from a worker thread.
 
         Examples
         --------
@@ -75,48 +140,682 @@ class ReadCSV:
         Returns
         -------
         flow  :  narray
+
+        Raises
+        ------
+        SampleFormatError
+            If a sample file is malformed and the policy is ``fail``.
+        LoadCancelled
+            If ``progress`` returned ``False``.
         """
         self.prefixed.sort(key=natural_keys)  # Sorted with filename and sample number
+        scale = self.sample_scale()
+
+        if self.cache is not None:
+            flow = self._load_cache(scale)
+            if flow is not None:
+                self._files, self._samples = self._stat(self.prefixed), flow
+                return flow
 
-        temp = [self.data_folder + self.prefixed for self.prefixed in self.prefixed]
-        data = [np.genfromtxt(f, delimiter=",") for f in temp]
-        data = np.asarray(data)
+        files = self._stat(self.prefixed)
 
-        return data
+        temp = [self.data_folder + name for name in self.prefixed]
+        shape = self.time_feature_length()
+        shape = (len(temp), shape['time_length'], shape['feature_length'])
+        flow = self.cache.create(shape, self.dtype) if self.cache is not None else None
+        cached = flow is not None
+        if not cached:
+            flow = np.empty(shape, dtype=self.dtype)
 
-    def get_split_data(self, split_to=0.5):
+        try:
+            with span('parse', files=len(temp)), self._executor(workers, len(temp)) as executor:
+                issues, skipped = self._parse_into(flow, temp, executor, progress,
+                                                   [files[name][0] for name in self.prefixed], self._parser(scale))
+        except Exception:
+            if cached:
+                del flow
+                self.cache.discard()
+            raise
+
+        if skipped:
+            samples = flow[np.setdiff1d(np.arange(len(flow)), skipped)]
+            del flow
+            flow, cached = self._store(samples, cached)
+
+        names = [self.prefixed[index] for index in skipped]
+        self.skipped = {name: stat for name, stat in self.skipped.items() if name not in files}
+        self.skipped.update((name, files[name]) for name in names)
+        self.prefixed = [name for name in self.prefixed if name not in self.skipped]
+        files = {name: files[name] for name in self.prefixed}
+        self._report(issues, names)
+
+        if cached:
+            flow.flush()
+            del flow  # The memory map has to be closed before it is renamed.
+            flow = self.cache.commit(self.prefixed, self.dtype, files, scale, self.on_error, self.skipped)
+
+        self._files, self._samples = files, flow
+        return flow
+
+    def scan(self):
+        """Compare the folder with the loaded samples
+
+        Lists the sample files that were added, modified or removed since the samples were last read by
+        ``read_samples`` or ``refresh``. A file is modified if its size or modification time changed.
+
+        Returns
+        -------
+        flow  :  dict
+            Returns a dictionary with the following:
+
+            - ``added`` - New sample files as *list*.
+            - ``modified`` - Changed sample files as *list*.
+            - ``removed`` - Deleted sample files as *list*.
+        """
+        flow = self._scan()[3]
+        return flow
+
+    @span('refresh')
+    def refresh(self, workers=None, progress=None):
+        """Incrementally reload the samples
+
+        Only the sample files that were added or modified since the last ``read_samples`` or ``refresh`` are parsed,
+        the samples of the other files are copied from the current tensor and the samples of deleted files are
+        dropped. The result is in the same natural order as ``read_samples`` and replaces the cache if caching is
+        enabled. The first call reads everything with ``read_samples``.
+
+        Parameters
+        ----------
+        workers
+            Overrides the number of workers given to the constructor.
+        progress
+            Optional callable like in ``read_samples``, only counting the files that are parsed.
+
+        Examples
+        --------
+
+        >>> files = ReadCSV('data')
+        >>> samples = files.read_samples()
+        >>> # sam_401.csv is written to the folder
+        >>> samples = files.refresh()
+
+        Returns
+        -------
+        flow  :  narray
+
+        Raises
+        ------
+        SampleFormatError
+            If a new sample file is malformed and the policy is ``fail``, the loaded samples are left as they were.
+        LoadCancelled
+            If ``progress`` returned ``False``, the loaded samples are left as they were.
+        """
+        if self._samples is None:
+            self.prefixed, self._listing, self._others = self._scan_folder()
+            self._metadata = None
+            return self.read_samples(workers, progress)
+
+        names, files, others, changes = self._scan()
+        if not any(changes.values()):
+            return self._samples
+
+        if self._metadata is None:
+            # Sniffed from the folder as it is now, the files the samples were loaded from may be gone.
+            with span('metadata'):
+                self._metadata = self._read_metadata(names)
+
+        old = self._samples
+        scale = self.sample_scale()
+        old_index = {name: index for index, name in enumerate(self.prefixed)}
+        changed = set(changes['added'] + changes['modified'])
+        parse = [index for index, name in enumerate(names) if name in changed]
+        keep = [index for index, name in enumerate(names) if name not in changed]
+
+        shape = (len(names),) + old.shape[1:]
+        flow = self.cache.create(shape, self.dtype) if self.cache is not None else None
+        cached = flow is not None
+        if not cached:
+            flow = np.empty(shape, dtype=self.dtype)
+
+        try:
+            # Unchanged samples are copied run by run, appending files to the folder gives a single run.
+            for new, start, stop in _runs(keep, [old_index[names[index]] for index in keep]):
+                flow[new:new + stop - start] = old[start:stop]
+
+            # A single run of changed files is parsed in place, anything else is parsed aside and scattered.
+            paths = [self.data_folder + names[index] for index in parse]
+            direct = bool(parse) and parse[-1] - parse[0] == len(parse) - 1
+            if direct:
+                out = flow[parse[0]:parse[-1] + 1]
+            else:
+                out = np.empty((len(parse),) + shape[1:], dtype=self.dtype)
+
+            with span('parse', files=len(paths)), self._executor(workers, len(paths)) as executor:
+                issues, skipped = self._parse_into(out, paths, executor, progress,
+                                                   [files[names[index]][0] for index in parse], self._parser(scale))
+
+            if not direct:
+                flow[parse] = out
+        except Exception:
+            if cached:
+                del flow
+                self.cache.discard()
+            raise
+
+        logger.info("Refreshed {}: {} added, {} modified, {} removed".format(
+            self.data_folder, len(changes['added']), len(changes['modified']), len(changes['removed'])))
+
+        rows = [parse[index] for index in skipped]
+        if rows:
+            samples = flow[np.setdiff1d(np.arange(len(flow)), rows)]
+            del flow
+            flow, cached = self._store(samples, cached)
+
+        skipped = [names[row] for row in rows]
+        self.skipped = {name: stat for name, stat in self.skipped.items() if files.get(name) == stat}
+        self.skipped.update((name, files[name]) for name in skipped)
+        self._report(issues, skipped)
+
+        self.prefixed = [name for name in names if name not in self.skipped]
+        self._files = {name: files[name] for name in self.prefixed}
+        self._listing, self._others = dict(files), others
+        # The files the format was sniffed from may be gone, the loaded samples keep their shape and format.
+        with span('metadata'):
+            self._metadata = self._read_metadata(loaded=self._metadata)
+        if cached:
+            flow.flush()
+            del flow, old
+            self._samples = None
+            flow = self.cache.commit(self.prefixed, self.dtype, files, scale, self.on_error, self.skipped)
+
+        self._samples = flow
+        self._update_stats(changes, len(keep))
+        return flow
+
+    def stats(self):
+        """Sample statistics
+
+        Per-sample and per-feature statistics of the samples along with the number of samples of every class, see
+        ``SampleStats``. They are computed once, ``refresh`` updates them with the samples appended to the folder and
+        recomputes them if a sample was modified or removed.
+
+        Returns
+        -------
+        flow  :  SampleStats
+        """
+        if self._stats is None:
+            data = self._samples if self._samples is not None else self.read_samples()
+            labels = self._get_class_labels()
+            self._stats = SampleStats.from_samples(data, labels if len(labels) == len(data) else None,
+                                                   scale=self.sample_scale())
+        return self._stats
+
+    def _update_stats(self, changes, kept):
+        """
+        Brings the statistics up to date after ``refresh``, samples appended after the ``kept`` ones are added to
+        them, anything else needs them to be recomputed.
+        """
+        if self._stats is None:
+            return
+
+        appended = not changes['modified'] and not changes['removed'] and self.prefixed[kept:] == changes['added']
+        labels = self._get_class_labels()
+        if not appended or (len(labels) == len(self.prefixed)) != bool(self._stats.class_counts):
+            self._stats = None
+            return
+
+        with span('stats', samples=len(self.prefixed) - kept):
+            self._stats.update(self._samples[kept:], labels[kept:] if self._stats.class_counts else None,
+                               scale=self.scale)
+
+    def sample_scale(self):
+        """Scale of int16 samples
+
+        An ``int16`` sample value ``q`` stands for ``q * scale``. Unless it was given to the constructor, the scale is
+        taken from the first sample, leaving room for values twice as large as its largest one, and kept for the
+        lifetime of the instance so that ``refresh`` can reuse the loaded samples.
+
+        Returns
+        -------
+        flow  :  float, None
+            ``None`` unless the samples are ``int16``.
+        """
+        if self.dtype == np.int16 and self.scale is None and self.prefixed:
+            first = sorted(self.prefixed, key=natural_keys)[0]
+            with span('scale'):
+                self.scale = auto_scale(parse_sample(self.data_folder + first, fmt=self.metadata()['format'])[0])
+            logger.info("int16 samples scaled by {:.6g}, from {}".format(self.scale, first))
+        return self.scale
+
+    def total_size(self, names=None):
+        """
+        Returns the size of sample files in bytes, from the last folder scan.
+
+        Parameters
+        ----------
+        names
+            Sample file names, defaults to all of them.
+
+        Returns
+        -------
+        flow  :  int
+        """
+        files = self._stat(self.prefixed if names is None else names)
+        flow = sum(size for size, mtime in files.values())
+        return flow
+
+    def _scan_folder(self):
+        """
+        Lists the folder with a single ``os.scandir``, returns the sample file names in natural order, their size and
+        modification time, and the names of the other files.
+        """
+        with span('scan', folder=self.data_folder):
+            samples, others = {}, set()
+            for entry in os.scandir(self.data_folder):
+                if not entry.is_file():
+                    continue
+                if entry.name.startswith("sam"):
+                    stat = entry.stat()
+                    samples[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                else:
+                    others.add(entry.name)
+
+            names = sorted(samples, key=natural_keys)
+        count('files_scanned', len(samples) + len(others))
+        return names, {name: samples[name] for name in names}, others
+
+    def _load_cache(self, scale):
+        """
+        Opens the cache if it was built from the same files with the same policy. The files it skipped are left out
+        of ``prefixed`` and kept in ``skipped``, unless they changed since.
+        """
+        names = sorted(set(self.prefixed).union(self.skipped), key=natural_keys)
+        flow = self.cache.load(names, self.dtype, self._stat(names), scale, self.on_error)
+        if flow is not None:
+            self.skipped = dict(self.cache.skipped)
+            self.prefixed = [name for name in names if name not in self.skipped]
+        return flow
+
+    def _stat(self, names):
+        """
+        Returns the size and modification time of every file in ``names``, from the last folder scan where possible.
+        """
+        flow = {}
+        for name in names:
+            if name not in self._listing:
+                stat = os.stat(self.data_folder + name)
+                self._listing[name] = (stat.st_size, stat.st_mtime_ns)
+            flow[name] = self._listing[name]
+        return flow
+
+    def _scan(self):
+        """
+        Scans the folder and compares it with the loaded samples, returns the names, the stats of all sample files, the
+        other files and the changes. Skipped files that did not change are left out.
+        """
+        names, files, others = self._scan_folder()
+        names = [name for name in names if self.skipped.get(name) != files[name]]
+        changes = {'added': [name for name in names if name not in self._files],
+                   'modified': [name for name in names if name in self._files and self._files[name] != files[name]],
+                   'removed': [name for name in self._files if name not in files]}
+        return names, files, others, changes
+
+    def iter_samples(self, batch_size=None, indices=None, workers=None):
+        """Iterate over the samples
+
+        Yields the samples in the same order as ``read_samples`` while keeping at most one batch in memory. A valid
+        cache is sliced directly, otherwise each batch is parsed when it is asked for. Files skipped by the
+        ``on_error`` policy are left out of their batch.
+
+        Parameters
+        ----------
+        batch_size
+            Number of samples per batch. If ``None``, samples are yielded one at a time as 2D arrays.
+        indices
+            Optional sequence of sample indices to iterate over, in the given order.
+        workers
+            Overrides the number of workers given to the constructor.
+
+        Examples
+        --------
+
+        >>> files = ReadCSV('data')
+        >>> for batch in files.iter_samples(batch_size=100):
+        >>>     # Do something with the (100, time, features) batch
+        >>>     pass
+
+        Returns
+        -------
+        flow  :  generator
+            Generator of 2D samples or 3D batches.
+        """
+        self.prefixed.sort(key=natural_keys)
+        scale = self.sample_scale()
+        cached = self._load_cache(scale) if self.cache is not None else None
+
+        if indices is None:
+            indices = range(len(self.prefixed))
+        indices = list(indices)
+        step = batch_size or 1
+
+        files = self._stat(self.prefixed)
+        if cached is not None:
+            for start in range(0, len(indices), step):
+                batch = cached[indices[start:start + step]]
+                yield batch if batch_size else batch[0]
+            return
+
+        shape = self.time_feature_length()
+        parser = self._parser(scale)
+        issues, skipped = [], []
+        with self._executor(workers, step) as executor:
+            for start in range(0, len(indices), step):
+                names = [self.prefixed[i] for i in indices[start:start + step]]
+                temp = [self.data_folder + name for name in names]
+                batch = np.empty((len(temp), shape['time_length'], shape['feature_length']), dtype=self.dtype)
+                with span('parse', files=len(temp)):
+                    found, left_out = self._parse_into(batch, temp, executor, parser=parser)
+
+                issues += found
+                if left_out:
+                    skipped += [names[index] for index in left_out]
+                    batch = np.delete(batch, left_out, axis=0)
+                    if not len(batch):
+                        continue
+                yield batch if batch_size else batch[0]
+
+        # Only once every batch was yielded, so that ``indices`` keep pointing at the same samples.
+        self.skipped.update((name, files[name]) for name in skipped)
+        self.prefixed = [name for name in self.prefixed if name not in self.skipped]
+        self._report(issues, skipped)
+
+    def _executor(self, workers, size):
+        """
+        Returns the pool used to parse ``size`` files, or a serial stand-in for a single worker.
+        """
+        workers = workers if workers is not None else self.workers
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers < 2 or size < 2:
+            return _SerialExecutor()
+        elif self.processes:
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def _parser(self, scale=None):
+        """
+        Returns ``parsing.parse_sample`` set to the format of the folder, the ``on_error`` policy and the ``dtype``,
+        ``scale`` is the scale of ``int16`` samples.
+        """
+        flow = partial(parse_sample, fmt=self.metadata()['format'], on_error=self.on_error, dtype=self.dtype,
+                       scale=scale)
+        return flow
+
+    @staticmethod
+    def _parse_into(out, paths, executor, progress=None, sizes=None, parser=parse_sample):
+        """
+        Parses ``paths`` into the preallocated ``out`` array with ``parser``, ``sizes`` of the files are used for the
+        progress. Returns the issues found and the sorted indices of the skipped files, whose rows in ``out`` are left
+        as they were.
+        """
+        lock = threading.Lock()
+        state = {'files': 0, 'bytes': 0, 'issues': [], 'skipped': [], 'cancelled': False}
+        load = partial(parser, shape=out.shape[1:])
+
+        def fill(index, result):
+            sample, issues = result
+            if issues:
+                with lock:
+                    state['issues'] += issues
+                    if sample is None:
+                        state['skipped'].append(index)
+
+            if sample is not None:
+                if sample.shape != out.shape[1:]:
+                    raise SampleShapeError("{} has shape {}, expected {}".format(
+                        paths[index], sample.shape, out.shape[1:]))
+                out[index] = sample
+
+            size = sizes[index] if sizes is not None else os.path.getsize(paths[index])
+            count('files_parsed')
+            count('bytes_read', size)
+
+            if progress is not None:
+                with lock:
+                    state['files'] += 1
+                    state['bytes'] += size
+                    if progress(state['files'], len(paths), state['bytes']) is False:
+                        state['cancelled'] = True
+                if state['cancelled']:
+                    raise LoadCancelled("Loading cancelled after {} of {} files".format(state['files'], len(paths)))
+
+        def parse(index):
+            if not state['cancelled']:
+                fill(index, load(paths[index]))
+
+        if isinstance(executor, ThreadPoolExecutor):
+            # Threads share the output array, so every sample is written in place as soon as it is parsed.
+            list(executor.map(parse, range(len(paths))))
+        else:
+            chunk_size = max(1, len(paths) // ((os.cpu_count() or 1) * 4))
+            for index, result in enumerate(executor.map(load, paths, chunksize=chunk_size)):
+                fill(index, result)
+
+        issues = sorted(state['issues'], key=lambda issue: (natural_keys(issue.file), issue.line or 0,
+                                                            issue.column or 0))
+        flow = (issues, sorted(state['skipped']))
+        return flow
+
+    def _store(self, samples, cached):
+        """
+        Moves ``samples`` into a new cache memory map if they were ``cached``, returns them and whether they are
+        cached.
+        """
+        if cached:
+            self.cache.discard()
+            flow = self.cache.create(samples.shape, self.dtype)
+            if flow is not None:
+                flow[:] = samples
+                return flow, True
+        return samples, False
+
+    def _report(self, issues, skipped):
+        """
+        Keeps and logs the ``issues`` found by a parse, ``skipped`` are the names of the files left out.
+        """
+        self.issues = issues
+        if not issues:
+            return
+
+        count('sample_issues', len(issues))
+        logger.warning("{} problems in {} sample files, {} skipped\n{}".format(
+            len(issues), len(set(issue.file for issue in issues)), len(skipped), format_issues(issues)))
+
+    def get_split_data(self, split_to=0.5, seed=None, stratify=False):
         """Get split data for training and testing.
 
+        The samples are not copied, the split is returned as two index arrays into ``full_data`` along with a
+        ``SampleSubset`` for each, which only reads the samples it is asked for.
+
         Parameters
         ----------
 
         split_to
-            Percentage split of data.
+            Percentage split of data, the fraction of samples used for testing.
+        seed
+            Seed of the random shuffle, for a repeatable split.
+        stratify
+            Keep the proportion of each class label in both the training and testing samples.
 
         Returns
         -------
         flow  :  dict
-            Returns a dictionary of two``DataFrame``, and one ``float``.
+            Returns a dictionary of two index ``narray``, two ``SampleSubset``, the samples, the ``int16`` scale
+            (``None`` for float samples) and one ``float``.
 
         Examples
         --------
 
         >>> files = ReadCSV()
         >>> files.get_split_data()
-        {'test_data': DataFrame,
-         'train_data': DataFrame,
-         'full_data': DataFrame,
+        {'test_index': narray,
+         'train_index': narray,
+         'test_data': SampleSubset,
+         'train_data': SampleSubset,
+         'full_data': narray,
+         'scale': float,
          'training_split': float}
         """
+        if not 0 < split_to < 1:
+            raise SplitDataException("Split data should be between 0 and 1.0")
+
         data = self.read_samples()
+        labels = self._get_class_labels() if stratify else None
 
-        if split_to > 1:
-            raise SplitDataException("Split data should be less that 1.0")
+        with span('split', samples=len(data), stratify=stratify):
+            train, test = train_test_indices(len(data), test_size=split_to, seed=seed, stratify=labels)
 
-        train, test = train_test_split(data, test_size=split_to)
+        flow = _split(data, train, test, self.sample_scale())
+        flow['training_split'] = split_to
+
+        return flow
 
-        flow = {'test_data': test, 'train_data': train, 'full_data': data, 'training_split': split_to}
+    def k_fold_split(self, n_splits=5, shuffle=True, seed=None, stratify=False):
+        """K-fold cross validation splits.
+
+        The samples are read once, every fold is a pair of index arrays and ``SampleSubset`` into them.
+
+        Parameters
+        ----------
+        n_splits
+            Number of folds.
+        shuffle
+            Shuffle the samples before assigning them to folds.
+        seed
+            Seed of the random shuffle.
+        stratify
+            Keep the proportion of each class label in every fold.
+
+        Examples
+        --------
 
+        >>> files = ReadCSV('data')
+        >>> for fold in files.k_fold_split(n_splits=10):
+        >>>     train = fold['train_data']
+        >>>     test = fold['test_data']
+
+        Returns
+        -------
+        flow  :  generator
+            Generator of dictionaries like ``get_split_data``, with ``fold`` instead of ``training_split``.
+        """
+        data = self.read_samples()
+        labels = self._get_class_labels() if stratify else None
+
+        with span('split', samples=len(data), folds=n_splits, stratify=stratify):
+            folds = list(k_fold_indices(len(data), n_splits, shuffle, seed, labels))
+
+        for fold, (train, test) in enumerate(folds):
+            flow = _split(data, train, test, self.scale)
+            flow['fold'] = fold
+            yield flow
+
+    def repeated_holdout(self, n_repeats=10, split_to=0.5, seed=None, stratify=False):
+        """Repeated random training and testing splits.
+
+        Parameters
+        ----------
+        n_repeats
+            Number of splits.
+        split_to
+            Percentage split of data, the fraction of samples used for testing.
+        seed
+            Seed of the first split, every following split uses the next seed.
+        stratify
+            Keep the proportion of each class label in both the training and testing samples.
+
+        Returns
+        -------
+        flow  :  generator
+            Generator of dictionaries like ``get_split_data``, with an additional ``repeat``.
+        """
+        if not 0 < split_to < 1:
+            raise SplitDataException("Split data should be between 0 and 1.0")
+
+        data = self.read_samples()
+        labels = self._get_class_labels() if stratify else None
+        rng = np.random.RandomState(seed)
+
+        for repeat in range(n_repeats):
+            with span('split', samples=len(data), repeat=repeat, stratify=stratify):
+                train, test = train_test_indices(len(data), test_size=split_to, seed=rng.randint(2 ** 31 - 1),
+                                                 stratify=labels)
+            flow = _split(data, train, test, self.scale)
+            flow['training_split'] = split_to
+            flow['repeat'] = repeat
+            yield flow
+
+    def metadata(self):
+        """Folder metadata
+
+        Reads everything besides the samples that is needed to load the folder, once, and keeps it on the instance.
+        The folder listing comes from the constructor's ``os.scandir``. The shape of the samples is the one most of a
+        few samples spread over the folder have, so that a single malformed file does not decide it. It is used for all
+        of them and checked as each one is parsed. ``refresh`` reads the feature names and class labels again when the
+        folder changes.
+
+        Returns
+        -------
+
+        flow  :  dict
+            Returns a dictionary with the following:
+
+            - ``time_length`` - Time length of a sample as *int*.
+            - ``feature_length`` - Feature length of a sample as *int*.
+            - ``dtype`` - Data type of the sample tensor.
+            - ``format`` - ``parsing.SampleFormat`` of the sample files, sniffed from one that has their shape.
+            - ``feature_names`` - Names in ``feature_names_eeg.txt`` as *list*, ``None`` if there is no such file.
+            - ``class_labels`` - Labels in ``tar_class_labels.csv`` as *list*, ``None`` if there is no such file.
+        """
+        if self._metadata is not None:
+            return self._metadata
+
+        with span('metadata'):
+            self._metadata = self._read_metadata()
+        return self._metadata
+
+    def _read_metadata(self, names=None, loaded=None):
+        """
+        Reads the metadata returned by ``metadata``. The shape and format of the samples are sniffed from ``names``,
+        which defaults to ``prefixed``, or taken from the ``loaded`` metadata if given.
+        """
+        names = self.prefixed if names is None else names
+        time_length = feature_length = 0
+        fmt = DEFAULT_FORMAT
+        if loaded is not None:
+            time_length, feature_length, fmt = loaded['time_length'], loaded['feature_length'], loaded['format']
+        elif names:
+            names = sorted(names, key=natural_keys)
+            names = [names[index] for index in sorted(set(np.linspace(0, len(names) - 1, SHAPE_SAMPLES, dtype=int)))]
+            files = self._stat(names)
+            shapes = [_sniff_shape(self.data_folder + name, files[name][0]) for name in names]
+            # Ties go to the earliest file.
+            shape = Counter(shape[:2] for shape in shapes).most_common(1)[0][0]
+            time_length, feature_length, fmt = next(found for found in shapes if found[:2] == shape)
+
+        feature_names = None
+        if 'feature_names_eeg.txt' in self._others:
+            with open(self.data_folder + 'feature_names_eeg.txt', 'r') as f:
+                feature_names = f.read().split('\n')
+
+        class_labels = None
+        if 'tar_class_labels.csv' in self._others:
+            with open(self.data_folder + 'tar_class_labels.csv', 'r') as f:
+                class_labels = [int(line.split(' ')[0]) for line in f.read().splitlines() if line.strip()]
+
+        flow = {'time_length': time_length, 'feature_length': feature_length, 'dtype': self.dtype, 'format': fmt,
+                'feature_names': feature_names, 'class_labels': class_labels}
         return flow
 
     def sample_size(self):
@@ -134,7 +833,7 @@ class ReadCSV:
 
     def time_feature_length(self):
         """
-        Returns the time length of a file by counting it's number of columns.
+        Returns the time length and number of features of a sample, see ``metadata``.
 
         Returns
         -------
@@ -145,15 +844,8 @@ class ReadCSV:
             - ``time_length`` - Time length of a sample as *int*.
             - ``feature_length`` - Feature length of a sample as *int*
         """
-        file = self.prefixed[0]
-        a = []
-        with open(self.data_folder + file) as csv_file:
-            reader = csv.reader(csv_file, delimiter=' ', quotechar='|')
-            for col in reader:
-                a.append(col)
-        csv_file.close()
-
-        flow = {'time_length': len(a), 'feature_length': len(a[0][0].split(','))}
+        metadata = self.metadata()
+        flow = {'time_length': metadata['time_length'], 'feature_length': metadata['feature_length']}
         return flow
 
     def get_feature_names(self):
@@ -170,25 +862,13 @@ class ReadCSV:
             - ``name_features`` - Feature names as *list*
         """
 
-        names = []
-        number_of_features = 0
-        if os.path.isfile(self.data_folder + 'feature_names_eeg.txt'):
-            try:
-                with open(self.data_folder + 'feature_names_eeg.txt', 'r') as f:
-                    data = f.read()
-                f.close()
-                names = data.split('\n')
-                number_of_features = len(names)
-            except IOError as e:
-                print("file not found - ", e)
+        metadata = self.metadata()
+        if metadata['feature_names'] is not None:
+            names = list(metadata['feature_names'])
         else:
-            with open(self.data_folder + self.prefixed[0]) as f:
-                number_of_features = len(f.readline().split(','))
-                for x in range(1, number_of_features + 1):
-                    names.append("feature {}".format(x))
-                f.close()
+            names = ["feature {}".format(x) for x in range(1, metadata['feature_length'] + 1)]
 
-        flow = {'number_of_features': number_of_features, 'name_features': names}
+        flow = {'number_of_features': len(names), 'name_features': names}
         return flow
 
     def _get_class_labels(self):
@@ -201,20 +881,244 @@ class ReadCSV:
         flow  :  list
             List of feature names if given or it is self generated.
         """
-        flow = []
-        if os.path.isfile(self.data_folder + 'tar_class_labels.csv'):
-            with open(self.data_folder + 'tar_class_labels.csv', 'r') as csv_file:
-                reader = csv.reader(csv_file, delimiter=' ', quotechar='|')
-                for row in reader:
-                    flow.append(int(row[0]))
-                csv_file.close()
-        else:
-            for temp in range(len(self.prefixed)):
-                flow.append(1)
-
+        labels = self.metadata()['class_labels']
+        if labels is not None and self.skipped:
+            # The labels are in the order of all sample files, including the skipped ones.
+            names = sorted(self.prefixed + list(self.skipped), key=natural_keys)
+            labels = [label for name, label in zip(names, labels) if name not in self.skipped]
+        flow = list(labels) if labels is not None else [1] * len(self.prefixed)
         return flow
 
 
+def train_test_indices(n_samples, test_size=0.5, seed=None, stratify=None):
+    """
+    Randomly splits ``n_samples`` into training and testing indices.
+
+    Parameters
+    ----------
+    n_samples: int
+        Number of samples.
+    test_size: float
+        Fraction of samples used for testing.
+    seed: int
+        Seed of the random shuffle.
+    stratify: list
+        Class label of every sample, if given each class is split separately so both parts keep its proportion.
+
+    Returns
+    -------
+    flow  :  tuple
+        Sorted training and testing indices as two ``narray``.
+    """
+    rng = np.random.RandomState(seed)
+
+    if stratify is None:
+        groups = [np.arange(n_samples)]
+    else:
+        stratify = np.asarray(stratify)
+        if len(stratify) != n_samples:
+            raise SplitDataException("Expected {} class labels, got {}".format(n_samples, len(stratify)))
+        groups = [np.flatnonzero(stratify == label) for label in np.unique(stratify)]
+
+    train, test = [], []
+    for group in groups:
+        group = rng.permutation(group)
+        n_test = int(np.ceil(test_size * len(group)))
+        if len(group) > 1:
+            n_test = min(max(n_test, 1), len(group) - 1)
+        test.append(group[:n_test])
+        train.append(group[n_test:])
+
+    flow = (np.sort(np.concatenate(train)), np.sort(np.concatenate(test)))
+    return flow
+
+
+def k_fold_indices(n_samples, n_splits=5, shuffle=True, seed=None, stratify=None):
+    """
+    Splits ``n_samples`` into ``n_splits`` folds.
+
+    Parameters
+    ----------
+    n_samples: int
+        Number of samples.
+    n_splits: int
+        Number of folds.
+    shuffle: bool
+        Shuffle the samples before assigning them to folds.
+    seed: int
+        Seed of the random shuffle.
+    stratify: list
+        Class label of every sample, if given every fold keeps the proportion of each class.
+
+    Returns
+    -------
+    flow  :  generator
+        Generator of sorted training and testing indices, as two ``narray``, for every fold.
+    """
+    if not 1 < n_splits <= n_samples:
+        raise SplitDataException("Number of folds should be between 2 and {}".format(n_samples))
+
+    rng = np.random.RandomState(seed)
+    order = rng.permutation(n_samples) if shuffle else np.arange(n_samples)
+    folds = np.empty(n_samples, dtype=np.intp)
+
+    if stratify is None:
+        folds[order] = np.arange(n_samples) * n_splits // n_samples
+    else:
+        stratify = np.asarray(stratify)[order]
+        offset = 0
+        for label in np.unique(stratify):
+            members = order[stratify == label]
+            # Deal each class round robin, carrying on from where the previous class stopped.
+            folds[members] = (np.arange(len(members)) + offset) % n_splits
+            offset += len(members)
+
+    for fold in range(n_splits):
+        flow = (np.flatnonzero(folds != fold), np.flatnonzero(folds == fold))
+        yield flow
+
+
+class SampleSubset:
+    """
+    Samples selected by index from a sample tensor, without copying them.
+
+    Only the samples that are indexed are read from the tensor, ``np.asarray`` materialises all of them in the type of
+    the tensor and ``values`` as floats.
+    """
+
+    def __init__(self, data, indices, scale=None):
+        """
+
+        Parameters
+        ----------
+        data
+            Sample tensor, can be a ``numpy.memmap``.
+        indices
+            Indices of the samples in ``data``.
+        scale
+            Scale of an ``int16`` tensor.
+        """
+        self.data = data
+        self.indices = np.asarray(indices)
+        self.scale = scale
+
+    @property
+    def shape(self):
+        return (len(self.indices),) + self.data.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        indices = self.indices[item]
+        if np.ndim(indices) == 0:
+            return self.data[indices]
+
+        # A run of consecutive indices is returned as a view.
+        if len(indices) and indices[-1] - indices[0] == len(indices) - 1 and np.all(np.diff(indices) == 1):
+            return self.data[indices[0]:indices[-1] + 1]
+        return self.data[indices]
+
+    def __iter__(self):
+        for index in self.indices:
+            yield self.data[index]
+
+    def __array__(self, dtype=None, copy=None):
+        flow = self.data[self.indices]
+        return flow if dtype is None else flow.astype(dtype)
+
+    def values(self, dtype=np.float32):
+        """
+        Returns the samples as ``dtype``, ``int16`` samples are scaled back to their values.
+        """
+        flow = dequantize(self.data[self.indices], self.scale, dtype)
+        return flow.astype(dtype, copy=False)
+
+
+def _runs(new, old):
+    """
+    Groups matching ``new`` and ``old`` indices into runs that are consecutive in both, yields
+    ``(new_start, old_start, old_stop)`` for every run.
+    """
+    new, old = np.asarray(new, dtype=np.intp), np.asarray(old, dtype=np.intp)
+    if not len(new):
+        return
+
+    breaks = np.flatnonzero((np.diff(new) != 1) | (np.diff(old) != 1)) + 1
+    for first, last in zip(np.r_[0, breaks], np.r_[breaks, len(new)]):
+        yield new[first], old[first], old[first] + last - first
+
+
+def _split(data, train, test, scale=None):
+    """
+    Builds the dictionary returned by the split methods of ``ReadCSV``.
+    """
+    flow = {'test_index': test, 'train_index': train, 'test_data': SampleSubset(data, test, scale),
+            'train_data': SampleSubset(data, train, scale), 'full_data': data, 'scale': scale}
+    return flow
+
+
+class _SerialExecutor:
+    """
+    Executor like object that runs ``map`` in the calling thread.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @staticmethod
+    def map(func, *iterables, **kwargs):
+        return map(func, *iterables)
+
+
+def _sniff_shape(path, size, block_size=65536):
+    """
+    Returns the number of rows and columns of a sample file along with its ``parsing.SampleFormat``.
+
+    The format is sniffed from the first block, header rows and blank lines are not counted. Only the first block is
+    read if it holds the whole file, or if all of its lines have the same length, the file size is a whole number of
+    lines and the file ends with such a line, which is the case for fixed width formats such as ``np.savetxt``'s.
+    Otherwise the remaining rows are counted block by block.
+    """
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        fmt = sniff_format(block)
+
+        lines = block.split(b'\n')
+        offset = sum(len(line) + 1 for line in lines[:fmt.header])
+        first = next((line for line in lines[fmt.header:] if line.strip()), b'').rstrip(b'\r').decode('latin-1')
+        cells = first.split(fmt.delimiter) if fmt.delimiter is not None else first.split()
+        columns = len(cells) - fmt.trailing if cells else 0
+
+        rest = lines.pop()  # The last line may go on in the next block.
+        lines = lines[fmt.header:]
+        if len(block) < size:
+            width = len(lines[0]) + 1 if lines else 0
+            if width > 1 and all(len(line) + 1 == width and line.strip() for line in lines) and \
+                    (size - offset) % width == 0:
+                f.seek(size - width)
+                last = f.read(width)
+                if last.endswith(b'\n') and b'\n' not in last[:-1] and last.strip():
+                    return (size - offset) // width, columns, fmt
+                f.seek(len(block))
+
+        rows = sum(1 for line in lines if line.strip())
+        for block in iter(lambda: f.read(block_size), b''):
+            lines = (rest + block).split(b'\n')
+            rest = lines.pop()
+            rows += sum(1 for line in lines if line.strip())
+        rows += bool(rest.strip())
+
+    return rows, columns, fmt
+
+
 def is_python3():
     """
     Check for Python 3
@@ -273,6 +1177,8 @@ def select_folder():
     """
     Open's a QT QFileDialog and returns the path of the folder
     """
+    from PyQt5 import QtWidgets
+
     logging.info("Select folder.")
     folder_location = QtWidgets.QFileDialog.getExistingDirectory(None, "Select Directory")
 
@@ -339,6 +1245,8 @@ def load_stylesheet():
     """
     Load's the ``style.qss``.
     """
+    from PyQt5 import QtCore
+
     # Smart import of the rc file
     import smlgui.gui.assets.style_rc
 
@@ -384,6 +1292,8 @@ def loading_effects_decorator(func):
     """
 
     def new_function(self):
+        from PyQt5 import QtWidgets, QtCore, QtGui
+
         QtWidgets.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
         try:
             func(self)
@@ -405,6 +1315,8 @@ def loading_effects_context():
     >>>     # Do something
     >>>     pass
     """
+    from PyQt5 import QtWidgets, QtCore, QtGui
+
     try:
         QtWidgets.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
         yield
@@ -478,6 +1390,20 @@ class SplitDataException(Exception):
         self.errors = errors
 
 
+class SampleShapeError(Exception):
+    def __init__(self, message, errors=None):
+        super(SampleShapeError, self).__init__(message)
+
+        self.errors = errors
+
+
+class LoadCancelled(Exception):
+    def __init__(self, message, errors=None):
+        super(LoadCancelled, self).__init__(message)
+
+        self.errors = errors
+
+
 class ConfigFileNotFound(Exception):
     def __init__(self, message, errors=None):
         super(ConfigFileNotFound, self).__init__(message)
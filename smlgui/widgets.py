@@ -2,73 +2,540 @@
 Custom widgets for the GUI
 """
 
-from PyQt5 import QtWidgets, QtCore
+from collections import OrderedDict
 
-__all__ = ['TabWidget', 'CustomQDialog', 'CustomQMainWidget']
+import numpy as np
+from PyQt5 import QtWidgets, QtCore, QtGui
 
+from smlgui.dtypes import dequantize
+from smlgui.profiling import span
+from smlgui.sml import SECTIONS
+from smlgui.sparse import SparseArray
 
-class TabWidget(QtWidgets.QTabWidget):
+__all__ = ['TabWidget', 'SectionTabWidget', 'StatsWidget', 'SignalPlotWidget', 'NumpyModel', 'SparseModel',
+           'CustomQDialog', 'CustomQMainWidget']
+
+_DISPLAY_ROLE = int(QtCore.Qt.DisplayRole)
+_ALIGNMENT_ROLE = int(QtCore.Qt.TextAlignmentRole)
+_SORT_ROLE = int(QtCore.Qt.UserRole)
+
+
+class TabWidget(QtWidgets.QWidget):
     """
-    Table widget to populate all the samples.
+    Table widget to browse all the samples.
+
+    Only the selected sample is shown, its ``NumpyModel`` is created when it is selected and released when another
+    sample is selected, so the number of samples does not affect the time or memory taken to build the widget. The
+    ``Plot`` tab shows the same sample with a ``SignalPlotWidget``, which is only updated while it is open. ``int16``
+    samples are shown scaled by ``scale``.
     """
-    def __init__(self, n_array, parent=None):
+    @span('TabWidget')
+    def __init__(self, n_array, parent=None, scale=None):
         super(TabWidget, self).__init__(parent)
 
-        tab_list = []
-        layoutlist = []
-        self.table_list = []
+        self._array = n_array
+        self._scale = scale
+        self.setMinimumHeight(150)
+        self.setMinimumWidth(400)
+
+        num_samples = n_array.shape[0]
+
+        self.sample_selector = QtWidgets.QSpinBox()
+        self.sample_selector.setRange(0, max(num_samples - 1, 0))
+        self.sample_selector.setPrefix("Sample ")
+        self.sample_selector.setSuffix(" of %s" % num_samples)
+        self.sample_selector.setKeyboardTracking(False)
+
+        self.table = QtWidgets.QTableView()
+        self.plot = SignalPlotWidget()
+        self._plotted = None
+
+        self.views = QtWidgets.QTabWidget()
+        self.views.setTabPosition(QtWidgets.QTabWidget.South)
+        self.views.addTab(self.table, "Table")
+        self.views.addTab(self.plot, "Plot")
+
+        selector_layout = QtWidgets.QHBoxLayout()
+        selector_layout.addWidget(self.sample_selector)
+        selector_layout.addStretch()
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(selector_layout)
+        layout.addWidget(self.views)
+        self.setLayout(layout)
+
+        self.sample_selector.valueChanged.connect(self.show_sample)
+        self.views.currentChanged.connect(self._update_plot)
+        if num_samples:
+            self.show_sample(0)
+
+    @span('show_sample')
+    def show_sample(self, index):
+        """
+        Shows the sample at ``index`` in the table.
+
+        Parameters
+        ----------
+        index: int
+            Sample number.
+        """
+        sample = self._array[index]
+        old_model = self.table.model()
+        if isinstance(sample, SparseArray):
+            self.table.setModel(SparseModel(sample, parent=self))
+        else:
+            self.table.setModel(NumpyModel(sample, parent=self, scale=self._scale))
+        if old_model is not None:
+            old_model.deleteLater()
+
+        # Sparse samples are event lists, which are not plotted.
+        self.views.setTabEnabled(1, not isinstance(sample, SparseArray))
+        self._update_plot()
+
+        if self.sample_selector.value() != index:
+            self.sample_selector.setValue(index)
+
+    def _update_plot(self):
+        index = self.sample_selector.value()
+        if self.views.currentWidget() is self.plot and self._plotted != index:
+            self.plot.set_data(dequantize(self._array[index], self._scale))
+            self._plotted = index
+
+
+class SectionTabWidget(QtWidgets.QTabWidget):
+    """
+    One tab for every section of an SML file.
+
+    A section is only read from the file when its tab is opened, samples are shown with a ``TabWidget`` and any
+    other section as a single table. Sparse sections are shown as a list of their non-zero entries.
+    """
+    def __init__(self, sml, parent=None):
+        super(SectionTabWidget, self).__init__(parent)
+
+        self.sml = sml
+        self.setMinimumHeight(150)
+        self.setMinimumWidth(400)
+
+        names = [name for name in SECTIONS if name in sml.sections]
+        names += sorted(name for name in sml.names() if name not in SECTIONS)
+
+        for name in names:
+            self.addTab(QtWidgets.QWidget(), "{} {}".format(name.capitalize(), sml.shape(name)))
+            self.widget(self.count() - 1).setObjectName(name)
+
+        self.currentChanged.connect(self.show_section)
+        if self.count():
+            self.show_section(0)
+
+    @span('show_section')
+    def show_section(self, index):
+        """
+        Populates the tab at ``index`` the first time it is shown.
+
+        Parameters
+        ----------
+        index: int
+            Tab number.
+        """
+        tab = self.widget(index)
+        if tab is None or tab.layout() is not None:
+            return
+
+        section = self.sml.section(tab.objectName())
+        if section.ndim == 3:
+            view = TabWidget(section, scale=self.sml.meta.get('scale') if tab.objectName() == 'samples' else None)
+        elif isinstance(section, SparseArray):
+            view = QtWidgets.QTableView()
+            view.setModel(SparseModel(section, parent=view))
+        else:
+            if section.ndim < 2:
+                section = np.asarray(section).reshape(len(section), -1)
+            view = QtWidgets.QTableView()
+            view.setModel(NumpyModel(section, parent=view))
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(view)
+        tab.setLayout(layout)
+
+
+class StatsWidget(QtWidgets.QWidget):
+    """
+    Shows a ``SampleStats``, a summary line above a table of per-feature and a table of per-sample statistics.
+    """
+    columns = ["Mean", "Std", "Min", "Max", "NaN"]
+
+    @span('StatsWidget')
+    def __init__(self, stats, feature_names=None, parent=None):
+        """
+
+        Parameters
+        ----------
+        stats: SampleStats
+            Statistics to show.
+        feature_names: list
+            Row headers of the per-feature table.
+        """
+        super(StatsWidget, self).__init__(parent)
         self.setMinimumHeight(150)
         self.setMinimumWidth(400)
 
-        num_tab_widgets = n_array.shape[0]
+        summary = "{} samples of {} x {}, {} missing values".format(
+            stats.n_samples, stats.time_length, stats.features, int(stats.sample_nan.sum()))
+        if stats.class_counts:
+            summary += "\nClasses: " + ", ".join("{}: {}".format(label, number)
+                                                 for label, number in sorted(stats.class_counts.items()))
+        self.summary = QtWidgets.QLabel(summary)
+
+        if feature_names is not None and len(feature_names) != stats.features:
+            feature_names = None
+
+        self.tables = QtWidgets.QTabWidget()
+        for title, table, row_headers in (("Features", stats.feature_table(), feature_names),
+                                          ("Samples", stats.sample_table(), None)):
+            view = QtWidgets.QTableView()
+            view.setModel(NumpyModel(table, headers=self.columns, row_headers=row_headers, parent=view,
+                                     number_format="%.5g"))
+            self.tables.addTab(view, title)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.summary)
+        layout.addWidget(self.tables)
+        self.setLayout(layout)
+
+
+class SignalPlotWidget(QtWidgets.QWidget):
+    """
+    Plots a ``(time, features)`` sample, one channel per feature stacked from top to bottom.
+
+    Channels are drawn from a ``_MinMaxPyramid``, every pixel column is a line from the minimum to the maximum of the
+    time steps it covers, so the number of points drawn depends on the width of the widget and not on the length of
+    the sample. Scroll to zoom around the cursor, drag to pan and double click to show the whole sample.
+    """
+    zoom_step = 1.25
+
+    def __init__(self, sample=None, feature_names=None, parent=None):
+        """
+
+        Parameters
+        ----------
+        sample
+            ``(time, features)`` array, can be set later with ``set_data``.
+        feature_names: list
+            Name drawn on every channel, defaults to the feature number.
+        """
+        super(SignalPlotWidget, self).__init__(parent)
+        self.setMinimumHeight(150)
+        self.setMinimumWidth(400)
+
+        self.feature_names = feature_names
+        self._pyramid = None
+        self._start = 0.0
+        self._stop = 0.0
+        self._drag = None
+
+        if sample is not None:
+            self.set_data(sample)
+
+    @span('set_plot_data')
+    def set_data(self, sample):
+        """
+        Plots ``sample``, showing all of it.
+
+        Parameters
+        ----------
+        sample
+            ``(time, features)`` array, or a 1D array for a single channel.
+        """
+        sample = np.asarray(sample)
+        if sample.ndim == 1:
+            sample = sample[:, None]
 
-        for i in range(num_tab_widgets):
-            tab_list.append(QtWidgets.QWidget())
-            self.addTab(tab_list[i], str('Sample %s' % i))
-            self.table_list.append(QtWidgets.QTableView())
-            setattr(self, 'Table%d' % i, self.table_list[i])
-            layoutlist.append(QtWidgets.QVBoxLayout())
+        self._pyramid = _MinMaxPyramid(sample)
+        self.reset_view()
 
-            model = NumpyModel(n_array[i])
-            self.table_list[i].setModel(model)
+    def view_range(self):
+        """
+        Returns the first and last time step shown.
+        """
+        return self._start, self._stop
 
-            layoutlist[i].addWidget(self.table_list[i])
-            tab_list[i].setLayout(layoutlist[i])
+    def set_view_range(self, start, stop):
+        """
+        Shows the time steps from ``start`` to ``stop``, kept within the sample.
+        """
+        length = len(self._pyramid) if self._pyramid is not None else 0
+        width = min(max(stop - start, 2.0), max(length - 1, 0))
+        start = min(max(start, 0.0), max(length - 1 - width, 0.0))
+
+        self._start, self._stop = start, start + width
+        self.update()
+
+    def reset_view(self):
+        """
+        Shows the whole sample.
+        """
+        self.set_view_range(0, len(self._pyramid) - 1 if self._pyramid is not None else 0)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        if self._pyramid is None or self._stop <= self._start:
+            return
+
+        width, height = self.width(), self.height()
+        channels = self._pyramid.features
+        lane = height / channels
+
+        x, low, high = self._pyramid.envelope(self._start, self._stop, width)
+        x = (x - self._start) * (width - 1) / (self._stop - self._start)
+        if high is not None:
+            # A vertical line per pixel column, from the minimum to the maximum.
+            x = np.repeat(x, 2)
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        pen = QtGui.QPen(self.palette().text().color())
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+
+        for channel in range(channels):
+            minimum, maximum = self._pyramid.limits[:, channel]
+            top = lane * channel + lane * 0.05
+            scale = lane * 0.9 / (maximum - minimum) if maximum > minimum else 0.0
+
+            values = low[:, channel] if high is None else np.column_stack([low[:, channel], high[:, channel]]).ravel()
+            y = top + lane * 0.9 - (values - minimum) * scale
+            y[~np.isfinite(y)] = top + lane * 0.45
+            painter.drawPolyline(_polygon(x, y))
+
+            name = self.feature_names[channel] if self.feature_names is not None else str(channel + 1)
+            painter.drawText(QtCore.QPointF(4, top + painter.fontMetrics().ascent()), name)
+
+    def wheelEvent(self, event):
+        if self._pyramid is None:
+            return
+
+        fraction = event.pos().x() / max(self.width() - 1, 1)
+        anchor = self._start + fraction * (self._stop - self._start)
+        width = (self._stop - self._start) * self.zoom_step ** (-event.angleDelta().y() / 120)
+        self.set_view_range(anchor - fraction * width, anchor - fraction * width + width)
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self._drag = (event.pos().x(), self._start, self._stop)
+
+    def mouseMoveEvent(self, event):
+        if self._drag is not None:
+            x, start, stop = self._drag
+            shift = (x - event.pos().x()) * (stop - start) / max(self.width() - 1, 1)
+            self.set_view_range(start + shift, stop + shift)
+
+    def mouseReleaseEvent(self, event):
+        self._drag = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+
+class _MinMaxPyramid:
+    """
+    Minimum and maximum of a ``(time, features)`` array over blocks of ``factor``, ``factor ** 2`` and so on time
+    steps, up to a single block. Every level keeps both a minimum and a maximum, so together the levels take two thirds
+    of the array's memory.
+    """
+    factor = 4
+
+    def __init__(self, data):
+        self.data = data
+        self.features = data.shape[1]
+        self.levels = []
+
+        low = high = data
+        block = 1
+        while len(low) > 1:
+            low, high = _reduce(low, np.fmin, self.factor), _reduce(high, np.fmax, self.factor)
+            block *= self.factor
+            self.levels.append((block, low, high))
+
+        self.limits = np.vstack([low[0], high[0]]) if len(low) else np.zeros((2, self.features))
+
+    def __len__(self):
+        return len(self.data)
+
+    def envelope(self, start, stop, pixels):
+        """
+        Returns the time steps from ``start`` to ``stop`` reduced to about ``pixels`` columns.
+
+        Returns
+        -------
+        flow  :  tuple
+            Time step of every column, the minimum and the maximum of every column. If there are fewer time steps
+            than pixels, the time steps themselves are returned with ``None`` for the maximum.
+        """
+        first = max(int(np.floor(start)), 0)
+        last = min(int(np.ceil(stop)) + 1, len(self.data))
+        per_pixel = (last - first) / max(pixels, 1)
+
+        if per_pixel <= 2:
+            return np.arange(first, last), self.data[first:last], None
+
+        block, low, high = 1, self.data, self.data
+        for level in self.levels:
+            if level[0] > per_pixel:
+                break
+            block, low, high = level
+
+        group = max(int(per_pixel // block), 1)
+        low = _reduce(low[first // block:-(-last // block)], np.fmin, group)
+        high = _reduce(high[first // block:-(-last // block)], np.fmax, group)
+
+        flow = ((first // block + np.arange(len(low)) * group) * block, low, high)
+        return flow
+
+
+def _reduce(array, ufunc, size):
+    """
+    Reduces every ``size`` rows of ``array`` with ``ufunc``, the last rows are padded with the last row.
+    """
+    pad = -len(array) % size
+    if pad:
+        array = np.concatenate([array, np.repeat(array[-1:], pad, axis=0)])
+    flow = ufunc.reduce(array.reshape((-1, size) + array.shape[1:]), axis=1)
+    return flow
+
+
+def _polygon(x, y):
+    """
+    Builds a ``QPolygonF`` from coordinate arrays by writing straight into its buffer.
+    """
+    flow = QtGui.QPolygonF(len(x))
+    if len(x):
+        pointer = flow.data()
+        pointer.setsize(len(x) * 2 * np.dtype(np.float64).itemsize)
+        points = np.frombuffer(pointer, dtype=np.float64).reshape(-1, 2)
+        points[:, 0] = x
+        points[:, 1] = y
+    return flow
 
 
 class NumpyModel(QtCore.QAbstractTableModel):
     """
     Adds 2D numpy array to the ``QTableView``
+
+    Cells are formatted a block of rows at a time and the formatted blocks are kept in a small LRU cache, so
+    repainting while scrolling only looks up strings. ``SortRole`` returns the value as a native ``float``. The
+    values of an ``int16`` array are shown multiplied by ``scale``.
     """
 
-    def __init__(self, n_array, headers=None, parent=None):
+    SortRole = QtCore.Qt.UserRole
+    chunk_rows = 64
+    max_chunks = 64
+
+    @span('NumpyModel')
+    def __init__(self, n_array, headers=None, row_headers=None, parent=None, number_format="%.5f", scale=None):
         QtCore.QAbstractTableModel.__init__(self, parent)
         self._array = n_array
+        self._scale = scale
+        self._format = number_format
+        self._chunks = OrderedDict()
+        self._alignment = int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        self._shape = n_array.shape
 
         if headers is not None:
             self.header_labels = headers
         else:
             self.header_labels = [str(i+1) for i in range(self._array.shape[1])]
 
+        self.row_labels = row_headers
+
     def rowCount(self, parent=None):
-        return self._array.shape[0]
+        return self._shape[0]
 
     def columnCount(self, parent=None):
-        return self._array.shape[1]
+        return self._shape[1]
 
     def data(self, index, role=QtCore.Qt.DisplayRole):
-        if index.isValid():
-            if role == QtCore.Qt.DisplayRole:
-                row = index.row()
-                col = index.column()
-                return QtCore.QVariant("%.5f" % self._array[row, col])
-        return QtCore.QVariant()
+        # Called for every role of every visible cell on each repaint, so unhandled roles return as early as possible.
+        if not index.isValid():
+            return None
+        if role == _DISPLAY_ROLE:
+            row = index.row()
+            return self._chunk(row // self.chunk_rows)[row % self.chunk_rows][index.column()]
+        elif role == _ALIGNMENT_ROLE:
+            return self._alignment
+        elif role == _SORT_ROLE:
+            return float(dequantize(self._array[index.row(), index.column()], self._scale))
+        return None
 
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
-        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
-            return self.header_labels[section]
+        if role == QtCore.Qt.DisplayRole:
+            if orientation == QtCore.Qt.Horizontal:
+                return self.header_labels[section]
+            elif self.row_labels is not None:
+                return self.row_labels[section]
         return QtCore.QAbstractTableModel.headerData(self, section, orientation, role)
 
+    def _chunk(self, number):
+        """
+        Returns the formatted rows of chunk ``number``, formatting them if they are not cached.
+
+        Parameters
+        ----------
+        number: int
+            Chunk number, rows ``number * chunk_rows`` up to the next chunk.
+
+        Returns
+        -------
+        flow  :  list
+            List of rows, each a list of ``str``.
+        """
+        flow = self._chunks.get(number)
+        if flow is not None:
+            self._chunks.move_to_end(number)
+            return flow
+
+        start = number * self.chunk_rows
+        block = dequantize(self._array[start:start + self.chunk_rows], self._scale)
+        flow = np.char.mod(self._format, block).tolist()
+
+        self._chunks[number] = flow
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return flow
+
+
+class SparseModel(NumpyModel):
+    """
+    Adds a ``SparseArray`` to the ``QTableView`` as a list of its non-zero entries, one row per entry with its
+    coordinates followed by its value. The table never holds the dense array.
+    """
+
+    def __init__(self, sparse, headers=None, parent=None):
+        if headers is None:
+            headers = ["Axis {}".format(axis + 1) for axis in range(sparse.ndim)] + ["Value"]
+        NumpyModel.__init__(self, _EventTable(sparse), headers=headers, parent=parent, number_format="%.5g")
+
+
+class _EventTable:
+    """
+    ``(nnz, ndim + 1)`` array like view of a ``SparseArray``'s entries, for ``SparseModel``.
+    """
+
+    def __init__(self, sparse):
+        self.sparse = sparse
+        self.shape = (sparse.nnz, sparse.ndim + 1)
+
+    def __getitem__(self, item):
+        if isinstance(item, tuple):
+            row, column = item
+            if column < self.sparse.ndim:
+                return self.sparse.coords[column, row]
+            return self.sparse.values[row]
+
+        return np.column_stack([self.sparse.coords[:, item].T, self.sparse.values[item]])
+
 
 class CustomQMainWidget(QtWidgets.QMainWindow):
     """
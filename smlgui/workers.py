@@ -0,0 +1,406 @@
+"""
+Background workers that keep lengthy jobs off the GUI thread.
+
+Each worker is a ``QObject`` that is moved to its own ``QThread`` with ``start_worker``, it reports back through
+signals, which Qt delivers on the GUI thread.
+"""
+import logging
+import time
+from functools import partial
+
+from PyQt5 import QtCore
+
+from smlgui.processor import export_sml, samples_to_csv, section_to_csv, ExportCancelled
+from smlgui.profiling import profiled
+from smlgui.sml import SMLReader
+from smlgui.stats import SampleStats
+from smlgui.utility import LoadCancelled
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SampleLoader', 'SMLExporter', 'CSVExporter', 'StatsWorker', 'FolderWatcher', 'start_worker']
+
+
+class SampleLoader(QtCore.QObject):
+    """
+    Reads all the samples of a ``ReadCSV`` in a background thread. With ``refresh`` only the files that changed
+    since the last load are read, see ``ReadCSV.refresh``. The statistics of the samples are brought up to date
+    before ``finished`` is emitted, so ``ReadCSV.stats`` returns straight away.
+
+    Signals
+    -------
+    progress
+        ``(files_parsed, total_files, bytes_parsed, total_bytes, eta)``, ``eta`` is in seconds.
+    finished
+        The sample tensor.
+    failed
+        Error message.
+    cancelled
+        Emitted when ``cancel`` stopped the load.
+    """
+    progress = QtCore.pyqtSignal(int, int, int, int, float)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, read_csv, refresh=False, parent=None):
+        super(SampleLoader, self).__init__(parent)
+        self.read_csv = read_csv
+        self.refresh = refresh
+        self._cancel = False
+        self._start = 0.0
+        self._total_bytes = 0
+
+    def run(self):
+        """
+        Reads the samples, called when the thread starts.
+        """
+        self._start = time.monotonic()
+
+        try:
+            if self.refresh:
+                changes = self.read_csv.scan()
+                names = changes['added'] + changes['modified']
+            else:
+                names = self.read_csv.prefixed
+            self._total_bytes = self.read_csv.total_size(names)
+
+            if self.refresh:
+                samples = self.read_csv.refresh(progress=self._on_progress)
+            else:
+                samples = self.read_csv.read_samples(progress=self._on_progress)
+            self.read_csv.stats()
+        except LoadCancelled as e:
+            logger.info(e.args[0])
+            self.cancelled.emit()
+        except Exception as e:
+            logger.exception("Unable to load samples")
+            self.failed.emit(str(e))
+        else:
+            logger.info("Loaded {} samples in {:.2f} s".format(len(samples), time.monotonic() - self._start))
+            self.finished.emit(samples)
+
+    def cancel(self):
+        """
+        Asks the loader to stop, can be called from any thread.
+        """
+        self._cancel = True
+
+    def _on_progress(self, files, total, nbytes):
+        elapsed = time.monotonic() - self._start
+        eta = elapsed / nbytes * (self._total_bytes - nbytes) if nbytes else 0.0
+        self.progress.emit(files, total, nbytes, self._total_bytes, eta)
+        return not self._cancel
+
+
+class SMLExporter(QtCore.QObject):
+    """
+    Streams the samples of a ``ReadCSV`` to an SML file in a background thread.
+
+    Signals
+    -------
+    progress
+        ``(samples_written, total_samples, eta)``, ``eta`` is in seconds.
+    finished
+        Path of the SML file.
+    failed
+        Error message.
+    cancelled
+        Emitted when ``cancel`` stopped the export, the SML file is not written.
+    """
+    progress = QtCore.pyqtSignal(int, int, float)
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, read_csv, output, parent=None, **options):
+        """
+
+        Parameters
+        ----------
+        read_csv: ReadCSV
+            Folder of samples to export.
+        output: str
+            Path of the SML file.
+        options
+            Passed on to ``processor.export_sml``.
+        """
+        super(SMLExporter, self).__init__(parent)
+        self.read_csv = read_csv
+        self.output = output
+        self.options = options
+        self._cancel = False
+        self._start = 0.0
+
+    def run(self):
+        """
+        Writes the SML file, called when the thread starts.
+        """
+        self._start = time.monotonic()
+
+        try:
+            export_sml(self.read_csv, self.output, progress=self._on_progress, **self.options)
+        except ExportCancelled as e:
+            logger.info(e.args[0])
+            self.cancelled.emit()
+        except Exception as e:
+            logger.exception("Unable to export " + self.output)
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(self.output)
+
+    def cancel(self):
+        """
+        Asks the exporter to stop, can be called from any thread.
+        """
+        self._cancel = True
+
+    def _on_progress(self, written, total):
+        elapsed = time.monotonic() - self._start
+        eta = elapsed / written * (total - written) if written else 0.0
+        self.progress.emit(written, total, eta)
+        return not self._cancel
+
+
+class CSVExporter(QtCore.QObject):
+    """
+    Writes a section of an SML file to CSV in a background thread.
+
+    Dense 3D sections are written to a folder with one file per sample, any other section to a single CSV file. The
+    worker opens its own ``SMLReader``, so the file can still be browsed while it runs.
+
+    Signals
+    -------
+    progress
+        ``(rows_written, total_rows, eta)``, ``eta`` is in seconds.
+    finished
+        Path of the CSV file or folder.
+    failed
+        Error message.
+    cancelled
+        Emitted when ``cancel`` stopped the export.
+    """
+    progress = QtCore.pyqtSignal(int, int, float)
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, path, name, output, parent=None):
+        """
+
+        Parameters
+        ----------
+        path: str
+            Path of the SML file.
+        name: str
+            Name of the section.
+        output: str
+            Path of the CSV file, or folder for a 3D section.
+        """
+        super(CSVExporter, self).__init__(parent)
+        self.path = path
+        self.name = name
+        self.output = output
+        self._cancel = False
+        self._start = 0.0
+
+    def run(self):
+        """
+        Writes the CSV, called when the thread starts.
+        """
+        self._start = time.monotonic()
+
+        try:
+            with SMLReader(self.path) as sml:
+                if len(sml.shape(self.name)) == 3 and not sml.is_sparse(self.name):
+                    samples_to_csv(sml, self.output, self.name, progress=self._on_progress)
+                else:
+                    section_to_csv(sml, self.name, self.output, progress=self._on_progress)
+        except ExportCancelled as e:
+            logger.info(e.args[0])
+            self.cancelled.emit()
+        except Exception as e:
+            logger.exception("Unable to export {} to {}".format(self.name, self.output))
+            self.failed.emit(str(e))
+        else:
+            logger.info("Exported {} to {} in {:.2f} s".format(self.name, self.output, time.monotonic() - self._start))
+            self.finished.emit(self.output)
+
+    def cancel(self):
+        """
+        Asks the exporter to stop, can be called from any thread.
+        """
+        self._cancel = True
+
+    def _on_progress(self, written, total):
+        elapsed = time.monotonic() - self._start
+        eta = elapsed / written * (total - written) if written else 0.0
+        self.progress.emit(written, total, eta)
+        return not self._cancel
+
+
+class StatsWorker(QtCore.QObject):
+    """
+    Computes the ``SampleStats`` of a section of an SML file in a background thread, with the class labels kept in
+    the file's metadata. The worker opens its own ``SMLReader``.
+
+    Signals
+    -------
+    finished
+        The ``SampleStats``.
+    failed
+        Error message.
+    cancelled
+        Emitted when ``cancel`` stopped the computation.
+    """
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, path, name='samples', parent=None):
+        """
+
+        Parameters
+        ----------
+        path: str
+            Path of the SML file.
+        name: str
+            Name of a dense 3D section.
+        """
+        super(StatsWorker, self).__init__(parent)
+        self.path = path
+        self.name = name
+        self.batch_size = 256
+        self._cancel = False
+
+    def run(self):
+        """
+        Computes the statistics, called when the thread starts.
+        """
+        try:
+            with SMLReader(self.path) as sml:
+                section = sml.section(self.name)
+                labels = sml.meta.get('class_labels')
+                if not labels or len(labels) != len(section):
+                    labels = None
+                scale = sml.meta.get('scale') if self.name == 'samples' else None
+
+                stats = SampleStats(section.shape[1], section.shape[2])
+                for start in range(0, len(section), self.batch_size):
+                    if self._cancel:
+                        self.cancelled.emit()
+                        return
+                    stop = start + self.batch_size
+                    stats.update(section[start:stop], labels[start:stop] if labels is not None else None, scale)
+        except Exception as e:
+            logger.exception("Unable to compute the statistics of " + self.path)
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(stats)
+
+    def cancel(self):
+        """
+        Asks the worker to stop, can be called from any thread.
+        """
+        self._cancel = True
+
+
+class FolderWatcher(QtCore.QObject):
+    """
+    Watches a sample folder and emits ``changed`` once it has been quiet for ``delay`` milliseconds.
+
+    Unlike the workers it lives on the GUI thread. ``QFileSystemWatcher`` reports every write, so the events are
+    debounced, a file that is still being written only triggers one ``changed`` after the writer is done. Only the
+    folder is watched, which reports added, removed and renamed files but not files written in place, those are found
+    by polling ``scan``. Watching every sample file would run out of file descriptors on large folders.
+
+    Signals
+    -------
+    changed
+        Emitted when sample files were added, modified or removed.
+    """
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, folder, scan=None, delay=1000, interval=5000, parent=None):
+        """
+
+        Parameters
+        ----------
+        folder: str
+            Folder to watch.
+        scan
+            Optional callable polled every ``interval`` milliseconds, it returns ``True`` if sample files changed,
+            for example from ``ReadCSV.scan``.
+        delay: int
+            Milliseconds without events before ``changed`` is emitted.
+        interval: int
+            Milliseconds between calls to ``scan``.
+        """
+        super(FolderWatcher, self).__init__(parent)
+        self.folder = folder
+        self.scan = scan
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self.changed)
+
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.addPath(folder)
+        self._watcher.directoryChanged.connect(self._timer.start)
+
+        self._poll = QtCore.QTimer(self)
+        self._poll.setInterval(interval)
+        self._poll.timeout.connect(self._on_poll)
+        if scan is not None:
+            self._poll.start()
+
+    def stop(self):
+        """
+        Stops watching the folder.
+        """
+        self._timer.stop()
+        self._poll.stop()
+        paths = self._watcher.files() + self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+
+    def _on_poll(self):
+        # A pending ``changed`` already covers whatever the scan would find.
+        if not self._timer.isActive() and self.scan():
+            self._timer.start()
+
+
+def _run_profiled(worker):
+    with profiled():
+        worker.run()
+
+
+def start_worker(worker, parent=None):
+    """
+    Moves ``worker`` to a new ``QThread`` and starts it. The thread quits and both are deleted once the worker
+    emits ``finished``, ``failed`` or ``cancelled``.
+
+    Parameters
+    ----------
+    worker: QtCore.QObject
+        Worker with a ``run`` method.
+    parent: QtCore.QObject
+        Parent of the thread.
+
+    Returns
+    -------
+    flow  :  QtCore.QThread
+        The running thread.
+    """
+    flow = QtCore.QThread(parent)
+    worker.moveToThread(flow)
+    flow.started.connect(partial(_run_profiled, worker), QtCore.Qt.DirectConnection)
+
+    for signal in (worker.finished, worker.failed, worker.cancelled):
+        signal.connect(flow.quit)
+    flow.finished.connect(worker.deleteLater)
+    flow.finished.connect(flow.deleteLater)
+
+    flow.start()
+    return flow